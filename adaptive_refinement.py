@@ -0,0 +1,113 @@
+"""Script that builds the amplification factor surface over the R and X solution space with
+adaptive (quadtree) refinement instead of a uniform grid. The AF surface is nearly flat almost
+everywhere and only changes sharply around the resonance where Zn = -Zs, so the space starts
+as a coarse grid of square cells and only cells where the AF changes by more than a tolerance
+(or that contain the resonance) are split into four, level by level, down to a minimum size.
+
+The result is a DataFrame of leaf cells that the plotter and the statistics below can use:
+    R       X       size    AF      AF_min  AF_max
+    5.0     -995.0  10.0    0.053   0.052   0.054
+    ...
+where R, X is the centre of the cell and AF is the AF at the centre.
+
+Date Created: 18/10/2026"""
+
+import numpy as np
+from pandas import DataFrame as df
+from background_harmonics import calc_amplification_points, gen_soln_ranges
+
+# constants
+CELL_COLUMNS = ['R', 'X', 'size', 'AF', 'AF_min', 'AF_max']
+# corners and centre of a unit cell, relative to the cell centre
+_CELL_POINTS = np.array([[-0.5, -0.5], [0.5, -0.5], [-0.5, 0.5], [0.5, 0.5], [0.0, 0.0]])
+# offsets of the four children centres, relative to the parent centre in parent sizes
+_CHILD_OFFSETS = np.array([[-0.25, -0.25], [0.25, -0.25], [-0.25, 0.25], [0.25, 0.25]])
+
+def adaptive_soln_space(site_x_h, site_r_h, xspan=[0,1000], yspan=[-1000,1000], coarse_step=10.0,
+                        min_step=0.05, tol=0.05, max_cells=5000000):
+    """Function calculates the AF surface on an adaptively refined quadtree of cells.
+
+    Args:
+        site_x_h (float): site inductance / capacitance in Ohms (X)
+        site_r_h (float): site resistance in Ohms (R)
+        xspan (list, optional): network R range. Defaults to [0,1000].
+        yspan (list, optional): network X range. Defaults to [-1000,1000].
+        coarse_step (float, optional): starting cell size in Ohms. Defaults to 10.0.
+        min_step (float, optional): smallest cell size in Ohms. Defaults to 0.05.
+        tol (float, optional): cells whose AF range over their corners and centre is larger
+            than this are split. Defaults to 0.05.
+        max_cells (int, optional): safety limit on the number of cells in one level.
+            Defaults to 5000000.
+
+    Returns:
+        DataFrame: leaf cells with CELL_COLUMNS
+    """
+    # coarse grid of cell centres covering the whole span
+    n_r = max(1, int(np.ceil((xspan[1] - xspan[0]) / coarse_step)))
+    n_x = max(1, int(np.ceil((yspan[1] - yspan[0]) / coarse_step)))
+    R_centres = xspan[0] + coarse_step*(np.arange(n_r) + 0.5)
+    X_centres = yspan[0] + coarse_step*(np.arange(n_x) + 0.5)
+    centres = np.stack(np.meshgrid(R_centres, X_centres), axis=-1).reshape(-1, 2)
+    size = coarse_step
+    resonance = np.array([-site_r_h, -site_x_h], dtype=float)
+
+    leaves = []
+    while len(centres):
+        assert len(centres) <= max_cells, f"Refinement needs more than {max_cells} cells, loosen tol or min_step!"
+        points = centres[:, None, :] + size*_CELL_POINTS[None, :, :]
+        AF = calc_amplification_points(site_x_h, site_r_h, points[..., 0], points[..., 1])
+        AF_min, AF_max = AF.min(axis=1), AF.max(axis=1)
+        contains_resonance = np.all(np.abs(centres - resonance) <= size/2, axis=1)
+        split = ((AF_max - AF_min > tol) | contains_resonance) if size/2 >= min_step else np.zeros(len(centres), dtype=bool)
+
+        keep = ~split
+        leaves.append(np.column_stack([
+            centres[keep], np.full(keep.sum(), size), AF[keep, 4], AF_min[keep], AF_max[keep]
+        ]))
+        centres = (centres[split][:, None, :] + size*_CHILD_OFFSETS[None, :, :]).reshape(-1, 2)
+        size = size/2
+    return df(np.concatenate(leaves), columns=CELL_COLUMNS)
+
+def adaptive_cell_stats(cells, percentiles=[50, 95, 99], thresholds=[1.0, 2.0]):
+    """Area weighted statistics of the AF over the adaptive cells, so that the finely split
+    cells around the resonance don't outweigh the coarse cells elsewhere.
+
+    Args:
+        cells (DataFrame): leaf cells from adaptive_soln_space
+        percentiles (list, optional): area weighted AF percentiles (0-100). Defaults to [50, 95, 99].
+        thresholds (list, optional): AF levels to report the area above. Defaults to [1.0, 2.0].
+
+    Returns:
+        dict: 'max' with its 'max_r', 'max_x', 'mean', 'percentiles' and 'area_above' (Ohm^2)
+    """
+    AF = cells['AF'].to_numpy()
+    area = cells['size'].to_numpy()**2
+    i = int(np.argmax(cells['AF_max'].to_numpy()))
+    order = np.argsort(AF)
+    cum_area = np.cumsum(area[order]) - area[order]/2
+    return {
+        'max': float(cells['AF_max'].iloc[i]), 'max_r': float(cells['R'].iloc[i]), 'max_x': float(cells['X'].iloc[i]),
+        'mean': float(np.sum(AF*area)/np.sum(area)),
+        'percentiles': {q: float(np.interp(q/100.0*area.sum(), cum_area, AF[order])) for q in percentiles},
+        'area_above': {t: float(area[AF > t].sum()) for t in thresholds},
+    }
+
+def rasterise_cells(cells, xspan=[0,1000], yspan=[-1000,1000], step=1.0):
+    """Samples the adaptive cells back onto a uniform grid (e.g. for plot_soln_space),
+    taking each grid point's AF from the cell it falls in.
+
+    Returns:
+        tuple: R_range, X_range and the (len(X_range), len(R_range)) AF grid
+    """
+    R_range, X_range = gen_soln_ranges(xspan=xspan, yspan=yspan, step=step)
+    ampfac = np.full((len(X_range), len(R_range)), np.nan)
+    # painting the largest cells first so the finer cells on top win on shared edges
+    for size in np.sort(cells['size'].unique())[::-1]:
+        group = cells[cells['size'] == size]
+        r0 = np.searchsorted(R_range, group['R'].to_numpy() - size/2, side='left')
+        r1 = np.searchsorted(R_range, group['R'].to_numpy() + size/2, side='right')
+        x0 = np.searchsorted(X_range, group['X'].to_numpy() - size/2, side='left')
+        x1 = np.searchsorted(X_range, group['X'].to_numpy() + size/2, side='right')
+        for a, b, c, d, af in zip(x0, x1, r0, r1, group['AF'].to_numpy()):
+            ampfac[a:b, c:d] = af
+    return R_range, X_range, ampfac
@@ -0,0 +1,202 @@
+"""Script that memoises the expensive results of the harmonic analysis (AF grids over the
+solution space and the network polygon sweeps) on disk, keyed by a hash of everything that
+goes into them. A rerun with the same site impedance, ranges, step, polygon and sampler seed
+loads the arrays back as read-only memory maps instead of recalculating them.
+
+Each result is a folder of .npy files named after the hash of its inputs. A small in-memory
+LRU sits in front of the disk cache and the disk cache is trimmed back to a size limit by
+dropping the least recently used results.
+
+Date Created: 18/10/2026"""
+
+import os
+import json
+import shutil
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from background_harmonics import gen_soln_ranges, calc_amplification_batch, calc_amplification_points
+from network_polygons import sample_points_in_polygon, interpolate_boundary_points
+
+# constants
+CACHE_DIR = '.af_cache' # default cache folder, relative to the working directory
+CACHE_MAX_BYTES = 2*1024**3 # disk cache size limit, 2 GB
+CACHE_MEMORY_ITEMS = 32 # results kept in the in-memory LRU
+
+def _hashable(value):
+    """Converts the cache inputs into something json can serialise deterministically"""
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return {'dtype': str(value.dtype), 'shape': value.shape, 'sha256': hashlib.sha256(value.tobytes()).hexdigest()}
+    if isinstance(value, (list, tuple)):
+        return [_hashable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _hashable(v) for k, v in sorted(value.items())}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def cache_key(**inputs):
+    """sha256 of the named inputs of a result"""
+    return hashlib.sha256(json.dumps(_hashable(inputs), sort_keys=True, default=str).encode()).hexdigest()
+
+class ResultCache():
+    """On disk cache of dicts of numpy arrays with an in-memory LRU in front of it.
+
+    Args:
+        directory (str, optional): cache folder. Defaults to CACHE_DIR.
+        max_bytes (int, optional): disk size limit. Defaults to CACHE_MAX_BYTES.
+        memory_items (int, optional): number of results kept in memory. Defaults to CACHE_MEMORY_ITEMS.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, memory_items=CACHE_MEMORY_ITEMS) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Returns the cached arrays as read-only memory maps, or None if not cached"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        arrays = {
+            os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+        # touching the folder so the disk eviction knows it was used recently
+        os.utime(path)
+        self._remember(key, arrays)
+        return arrays
+
+    def put(self, key, arrays):
+        """Saves a dict of arrays and returns them reloaded as memory maps. A result larger
+        than max_bytes on its own is not saved and the arrays are returned as they are."""
+        if sum(np.asarray(array).nbytes for array in arrays.values()) > self.max_bytes:
+            return arrays
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # writing to a temporary folder first so a crashed run never leaves a partial result
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(array))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self._memory.pop(key, None)
+        self.evict(keep=key)
+        return self.get(key)
+
+    def _remember(self, key, arrays):
+        self._memory[key] = arrays
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def size(self):
+        """Total size of the disk cache in bytes"""
+        total = 0
+        for entry in os.scandir(self.directory) if os.path.isdir(self.directory) else []:
+            if entry.is_dir():
+                total += sum(f.stat().st_size for f in os.scandir(entry.path))
+        return total
+
+    def evict(self, keep=None):
+        """Drops the least recently used results until the disk cache fits in max_bytes,
+        never dropping the result keep (the one just written)"""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and '.tmp' not in entry.name:
+                entries.append((entry.stat().st_mtime, sum(f.stat().st_size for f in os.scandir(entry.path)), entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(path) == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            self._memory.pop(os.path.basename(path), None)
+            total -= size
+
+    def clear(self):
+        """Deletes every cached result"""
+        self._memory.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_or_compute(self, key, compute, use_cache=True):
+        """Returns the cached arrays for key, calling compute() for a dict of arrays
+        (and caching it) when they are not cached yet. use_cache=False skips the cache."""
+        if not use_cache:
+            return compute()
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = self.put(key, compute())
+        return arrays
+
+_default_cache = None
+
+def default_cache():
+    """Shared ResultCache in CACHE_DIR, created on first use"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+def cached_soln_space(site_x_h, site_r_h, xspan=[0,1000], yspan=[-1000,1000], step=1.0, h=2,
+                      dtype=np.float64, cache=None, use_cache=True):
+    """Cached version of gen_soln_space + calc_amplification for one harmonic order.
+
+    Returns:
+        tuple: R_range, X_range and the (len(X_range), len(R_range)) AF grid
+    """
+    cache = cache or default_cache()
+    key = cache_key(
+        kind='soln_space', site_x_h=float(site_x_h), site_r_h=float(site_r_h), xspan=list(xspan),
+        yspan=list(yspan), step=float(step), h=int(h), dtype=np.dtype(dtype).name
+    )
+
+    def compute():
+        R_range, X_range = gen_soln_ranges(xspan=xspan, yspan=yspan, step=step)
+        AF = calc_amplification_batch(site_x_h, site_r_h, R_range, X_range, dtype=dtype)[0]
+        return {'R_range': R_range, 'X_range': X_range, 'AF': AF}
+
+    result = cache.get_or_compute(key, compute, use_cache=use_cache)
+    return result['R_range'], result['X_range'], result['AF']
+
+def cached_polygon_sweep(project, h, site_x_h, site_r_h, num_pts=100, num_points=1000, seed=0,
+                         method="rejection", cache=None, use_cache=True):
+    """Cached boundary and interior sweep of a network polygon: the points from
+    interpolate_boundary_points and sample_points_in_polygon and their AF. Only an int seed
+    identifies the sampled points, so with a Generator or None the sweep is not cached.
+
+    Returns:
+        dict: 'boundary' and 'inside' (n, 2) R, X points with 'boundary_AF' and 'inside_AF'
+    """
+    cache = cache or default_cache()
+    polygon = project._polygon_vertices(h)
+    use_cache = use_cache and isinstance(seed, (int, np.integer)) and not isinstance(seed, bool)
+    key = cache_key(
+        kind='polygon_sweep', polygon=polygon, h=int(h), site_x_h=float(site_x_h), site_r_h=float(site_r_h),
+        num_pts=int(num_pts), num_points=int(num_points), seed=int(seed) if use_cache else None, method=method
+    )
+
+    def compute():
+        boundary = interpolate_boundary_points(polygon, num_pts=num_pts)
+        inside = sample_points_in_polygon(
+            polygon, num_points, rng=seed, method=method, polygon=project.polygons.geometry(h)
+        )
+        return {
+            'boundary': boundary, 'inside': inside,
+            'boundary_AF': calc_amplification_points(site_x_h, site_r_h, boundary[:, 0], boundary[:, 1]),
+            'inside_AF': calc_amplification_points(site_x_h, site_r_h, inside[:, 0], inside[:, 1]),
+        }
+
+    return cache.get_or_compute(key, compute, use_cache=use_cache)
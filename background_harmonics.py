@@ -7,30 +7,267 @@ Created on: 11/12/23
 """
 
 import time
-import pandas as pd
+import logging
 import numpy as np
-from pandas import DataFrame as df
+from instrumentation import logger, timed
 
 # CONSTANTS
+CHUNK_ROWS = 64 # number of X rows evaluated per block in the batched calculations
+HIST_RANGE = (0.0, 10.0) # AF range binned by the solution space scans
+HIST_BINS = 10000 # 0.001 AF resolution across HIST_RANGE
 
 # FUNCTIONS
-def gen_soln_space(xspan=[0,1000], yspan=[-1000,1000], step=1.0):
+def gen_soln_ranges(xspan=[0,1000], yspan=[-1000,1000], step=1.0):
     # Define the ranges and steps for X and Y
     x_range = np.arange(xspan[0], xspan[1]+1, step)
     y_range = np.arange(yspan[0], yspan[1]+1, step)
+    return x_range, y_range
+
+@timed("grid_build", count=lambda result: result[0].size)
+def gen_soln_space(xspan=[0,1000], yspan=[-1000,1000], step=1.0):
+    x_range, y_range = gen_soln_ranges(xspan=xspan, yspan=yspan, step=step)
 
     # Generate the meshgrid using np.meshgrid
     X, Y = np.meshgrid(x_range, y_range)
     return X, Y, x_range, y_range
 
+@timed("af_compute", count=np.size)
 def calc_amplification(site_x_h, site_r_h, R, X, v_bkg_h=None , h=2):
     # calculating the voltage split at each network impedance point
     v_drop_h = (site_r_h+(1j*site_x_h)) / ((site_r_h+R)+1j*(site_x_h+X))
     amp_factor = abs(v_drop_h)
-    print(f'The maximum amplification factor for h={h} is {np.max(amp_factor)}.')
-    # print(amp_factor)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f'The maximum amplification factor for h={h} is {np.max(amp_factor)}.')
     return amp_factor
 
+@timed("af_compute_points", count=np.size)
+def calc_amplification_points(site_x_h, site_r_h, R, X, dtype=np.float64):
+    """Function calculates the amplification factor at arbitrary network impedance points
+    without printing, broadcasting the site and network impedances against each other.
+
+    Args:
+        site_x_h (float or array-like): site inductance / capacitance in Ohms (X)
+        site_r_h (float or array-like): site resistance in Ohms (R)
+        R (array-like): network resistance points in Ohms
+        X (array-like): network inductance / capacitance points in Ohms
+        dtype (numpy.dtype, optional): Defaults to np.float64.
+
+    Returns:
+        numpy.ndarray: AF with the broadcast shape of the inputs
+    """
+    site_x_h = np.asarray(site_x_h, dtype=dtype)
+    site_r_h = np.asarray(site_r_h, dtype=dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.hypot(site_r_h, site_x_h) / np.hypot(site_r_h + np.asarray(R, dtype=dtype), site_x_h + np.asarray(X, dtype=dtype))
+
+@timed("af_compute_batch", count=np.size)
+def calc_amplification_batch(site_x_h, site_r_h, R_range, X_range, dtype=np.float64, chunk_rows=CHUNK_ROWS, out=None):
+    """Function calculates the amplification factor for many harmonic orders at once
+    over one shared solution space. Instead of building a meshgrid per order, the site 
+    impedance of every order is broadcast against the 1D R and X ranges from gen_soln_space
+    and the AF cube is filled in blocks of X rows so the temporaries stay small.
+
+    AF = |Zs| / |Zs + Zn| = |Zs| / sqrt((Rs + R)^2 + (Xs + X)^2)
+
+    Args:
+        site_x_h (array-like): site inductance / capacitance in Ohms (X), one per order
+        site_r_h (array-like): site resistance in Ohms (R), one per order
+        R_range (numpy.ndarray): evenly spaced numbers across the network R range
+        X_range (numpy.ndarray): evenly spaced numbers across the network X range
+        dtype (numpy.dtype, optional): float32 halves the memory and runtime of the sweep 
+            at the cost of precision. Defaults to np.float64.
+        chunk_rows (int, optional): number of X rows calculated per block. Defaults to CHUNK_ROWS.
+        out (numpy.ndarray, optional): preallocated (or memory-mapped) array of shape
+            (n_orders, len(X_range), len(R_range)) to write the results into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: AF cube of shape (n_orders, len(X_range), len(R_range))
+    """
+    site_x_h = np.atleast_1d(np.asarray(site_x_h, dtype=dtype))
+    site_r_h = np.atleast_1d(np.asarray(site_r_h, dtype=dtype))
+    assert site_x_h.shape == site_r_h.shape, f"Got {len(site_x_h)} site X values and {len(site_r_h)} site R values!"
+    R_range = np.asarray(R_range, dtype=dtype)
+    X_range = np.asarray(X_range, dtype=dtype)
+    shape = (len(site_r_h), len(X_range), len(R_range))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    assert out.shape == shape, f"The output array has shape {out.shape} but {shape} is needed!"
+
+    # the squared R and X terms only depend on one axis each so are calculated once
+    site_z = np.hypot(site_r_h, site_x_h)[:, None, None]
+    r_sq = np.square(site_r_h[:, None, None] + R_range[None, None, :])
+    x_sq = np.square(site_x_h[:, None, None] + X_range[None, :, None])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, shape[1], chunk_rows):
+            block = out[:, start:start+chunk_rows, :]
+            np.add(r_sq, x_sq[:, start:start+chunk_rows, :], out=block)
+            np.sqrt(block, out=block)
+            np.divide(site_z, block, out=block)
+    return out
+
+def _axis_weights(axis_range, points):
+    """Lower index and linear weight of each point between its two neighbouring grid lines"""
+    axis_range = np.asarray(axis_range, dtype=float)
+    points = np.atleast_1d(np.asarray(points, dtype=float))
+    assert np.all((points >= axis_range[0]) & (points <= axis_range[-1])), \
+        f"Sensitivity points {points} are outside of the grid range {axis_range[0]} to {axis_range[-1]}!"
+    idx = np.clip(np.searchsorted(axis_range, points, side='right') - 1, 0, max(len(axis_range) - 2, 0))
+    if len(axis_range) < 2:
+        return idx, np.zeros(len(points))
+    weight = (points - axis_range[idx]) / (axis_range[idx + 1] - axis_range[idx])
+    return idx, weight
+
+def calc_sensitivities(R_range, X_range, r_h, x_h, ampfac=None, site_r_h=None, site_x_h=None):
+    """Function works out the sensitivity traces of the amplification factor through one or 
+    more network impedance points: AF along R at the point's X, and AF along X at the point's R.
+    With an AF grid the traces are linearly interpolated between the neighbouring grid lines,
+    found with a binary search, so any float point inside the grid can be used. Without a grid
+    the traces are calculated straight from the site impedance.
+
+    Args:
+        R_range (numpy.ndarray): R axis of the grid / traces
+        X_range (numpy.ndarray): X axis of the grid / traces
+        r_h (float or array-like): resistance of the sensitivity point(s) in Ohms
+        x_h (float or array-like): inductance / capacitance of the sensitivity point(s) in Ohms
+        ampfac (numpy.ndarray, optional): (len(X_range), len(R_range)) AF grid. Defaults to None.
+        site_r_h (float, optional): site resistance in Ohms (R), needed without a grid. Defaults to None.
+        site_x_h (float, optional): site inductance / capacitance in Ohms (X), needed without a grid. 
+            Defaults to None.
+
+    Returns:
+        tuple: AF over R (n_points, len(R_range)) and AF over X (n_points, len(X_range))
+    """
+    r_h, x_h = np.broadcast_arrays(np.atleast_1d(np.asarray(r_h, dtype=float)), np.atleast_1d(np.asarray(x_h, dtype=float)))
+    R_range = np.asarray(R_range, dtype=float)
+    X_range = np.asarray(X_range, dtype=float)
+    if ampfac is None:
+        assert site_r_h is not None and site_x_h is not None, "The site impedance is needed when there is no AF grid!"
+        af_over_r = calc_amplification_points(site_x_h, site_r_h, R_range[None, :], x_h[:, None])
+        af_over_x = calc_amplification_points(site_x_h, site_r_h, r_h[:, None], X_range[None, :])
+        return af_over_r, af_over_x
+
+    ampfac = np.asarray(ampfac)
+    x_idx, x_weight = _axis_weights(X_range, x_h)
+    r_idx, r_weight = _axis_weights(R_range, r_h)
+    x_next = np.minimum(x_idx + 1, len(X_range) - 1)
+    r_next = np.minimum(r_idx + 1, len(R_range) - 1)
+    af_over_r = (1 - x_weight)[:, None]*ampfac[x_idx, :] + x_weight[:, None]*ampfac[x_next, :]
+    af_over_x = (1 - r_weight)[:, None]*ampfac[:, r_idx].T + r_weight[:, None]*ampfac[:, r_next].T
+    return af_over_r, af_over_x
+
+def iter_amplification_tiles(site_x_h, site_r_h, xspan=[0,1000], yspan=[-1000,1000], step=1.0, 
+                             tile_rows=CHUNK_ROWS, dtype=np.float64, out=None):
+    """Generator that streams the amplification factor over the R and X solution space
+    in blocks of X rows so that the full meshgrid is never materialised.
+    Without out, one tile buffer is reused for every block to keep the memory constant, so a
+    yielded tile is only valid until the next iteration; copy it to keep it (list() of the
+    generator gives the same array over and over). With out, each tile is a view of out.
+
+    Args:
+        site_x_h (float): site inductance / capacitance in Ohms (X)
+        site_r_h (float): site resistance in Ohms (R)
+        xspan (list, optional): network R range. Defaults to [0,1000].
+        yspan (list, optional): network X range. Defaults to [-1000,1000].
+        step (float, optional): grid resolution in Ohms. Defaults to 1.0.
+        tile_rows (int, optional): number of X rows per tile. Defaults to CHUNK_ROWS.
+        dtype (numpy.dtype, optional): Defaults to np.float64.
+        out (numpy.ndarray, optional): full (len(X_range), len(R_range)) array, e.g. a memmap, 
+            that the tiles are written into. Defaults to None.
+
+    Yields:
+        tuple: (row index of the tile start, R_range, X values of the tile, AF tile). The AF
+            tile is overwritten by the next iteration unless out is given.
+    """
+    R_range, X_range = gen_soln_ranges(xspan=xspan, yspan=yspan, step=step)
+    tile = None
+    for start in range(0, len(X_range), tile_rows):
+        X_tile = X_range[start:start+tile_rows]
+        if out is not None:
+            tile = out[start:start+len(X_tile)]
+        elif tile is None or len(tile) != len(X_tile):
+            tile = np.empty((len(X_tile), len(R_range)), dtype=dtype)
+        calc_amplification_batch(
+            site_x_h, site_r_h, R_range, X_tile, dtype=dtype, chunk_rows=tile_rows, out=tile[None]
+        )
+        yield start, R_range, X_tile, tile
+
+def _hist_percentiles(counts, edges, overflow, total, max_af, percentiles):
+    """Reads percentiles off a histogram by interpolating linearly inside the bin.
+    Anything that falls past the last edge is interpolated towards the maximum AF."""
+    cum_counts = np.concatenate([[0], np.cumsum(counts)])
+    results = {}
+    for q in percentiles:
+        rank = q/100.0 * total
+        if rank <= cum_counts[-1]:
+            results[q] = float(np.interp(rank, cum_counts, edges))
+        else:
+            results[q] = float(np.interp(rank, [cum_counts[-1], total], [edges[-1], max_af])) if overflow else float(edges[-1])
+    return results
+
+@timed("af_scan", count=lambda result: result['count'])
+def scan_soln_space(site_x_h, site_r_h, xspan=[0,1000], yspan=[-1000,1000], step=1.0,
+                    percentiles=[50, 95, 99], thresholds=[1.0, 2.0], hist_range=HIST_RANGE, 
+                    hist_bins=HIST_BINS, tile_rows=CHUNK_ROWS, dtype=np.float64, out_filename=None):
+    """Function scans the amplification factor across the R and X solution space tile by
+    tile and keeps only running reductions, so that fine resolution scans run in constant memory.
+    Percentiles are read off the running histogram and are accurate to the bin width inside hist_range.
+
+    Args:
+        site_x_h (float): site inductance / capacitance in Ohms (X)
+        site_r_h (float): site resistance in Ohms (R)
+        xspan (list, optional): network R range. Defaults to [0,1000].
+        yspan (list, optional): network X range. Defaults to [-1000,1000].
+        step (float, optional): grid resolution in Ohms. Defaults to 1.0.
+        percentiles (list, optional): AF percentiles (0-100) to report. Defaults to [50, 95, 99].
+        thresholds (list, optional): AF levels to report the area above. Defaults to [1.0, 2.0].
+        hist_range (tuple, optional): AF range of the histogram. Defaults to HIST_RANGE.
+        hist_bins (int, optional): number of histogram bins. Defaults to HIST_BINS.
+        tile_rows (int, optional): number of X rows per tile. Defaults to CHUNK_ROWS.
+        dtype (numpy.dtype, optional): Defaults to np.float64.
+        out_filename (str, optional): if given, the full AF grid is also written to
+            this .npy file as a memory map. Defaults to None.
+
+    Returns:
+        dict: 'max', 'max_r', 'max_x', 'count', 'mean', 'histogram' (counts, edges, overflow), 
+            'percentiles' and 'area_above' (Ohm^2 per threshold) as well as 'af' (the memmap or None)
+    """
+    R_range, X_range = gen_soln_ranges(xspan=xspan, yspan=yspan, step=step)
+    out = None
+    if out_filename:
+        out = np.lib.format.open_memmap(out_filename, mode='w+', dtype=dtype, shape=(len(X_range), len(R_range)))
+
+    edges = np.linspace(hist_range[0], hist_range[1], hist_bins + 1)
+    counts = np.zeros(hist_bins, dtype=np.int64)
+    overflow = 0
+    above = np.zeros(len(thresholds), dtype=np.int64)
+    max_af, max_r, max_x = -np.inf, np.nan, np.nan
+    total, af_sum = 0, 0.0
+    for _, R_tile, X_tile, tile in iter_amplification_tiles(
+        site_x_h, site_r_h, xspan=xspan, yspan=yspan, step=step, tile_rows=tile_rows, dtype=dtype, out=out
+    ):
+        idx = np.argmax(tile)
+        row, col = np.unravel_index(idx, tile.shape)
+        if tile[row, col] > max_af:
+            max_af, max_r, max_x = float(tile[row, col]), float(R_tile[col]), float(X_tile[row])
+        counts += np.histogram(tile, bins=hist_bins, range=hist_range)[0]
+        overflow += int(np.count_nonzero(tile > hist_range[1]))
+        for i, threshold in enumerate(thresholds):
+            above[i] += np.count_nonzero(tile > threshold)
+        total += tile.size
+        af_sum += float(np.sum(tile, dtype=np.float64))
+
+    if out is not None:
+        out.flush()
+    return {
+        'max': max_af, 'max_r': max_r, 'max_x': max_x,
+        'count': total, 'mean': af_sum/total if total else np.nan,
+        'histogram': (counts, edges, overflow),
+        'percentiles': _hist_percentiles(counts, edges, overflow, total, max_af, percentiles),
+        'area_above': {t: float(n)*step**2 for t, n in zip(thresholds, above)},
+        'af': out,
+    }
+
 if __name__ == "__main__":
     start_time = time.time()
     # Network impedance range to be scanned across
@@ -0,0 +1,249 @@
+"""Script that runs the background harmonic amplification analysis for many IBR sites,
+harmonic orders and site impedance scenarios at once. The work is split into (site, order)
+chunks that are fanned out across a process pool. The network polygons of each site and
+polygon workbook are loaded once and shared read-only with the workers through shared memory.
+
+The manifest is a CSV (or DataFrame) in long format with one row per site, scenario and order:
+    site        scenario    polygon_file        polygon_sheet   Zbase   h   site_r_h    site_x_h
+    Puffer Fish base        test_data.xlsx      polygon         1.0     2   10.5        -120.3
+    Puffer Fish base        test_data.xlsx      polygon         1.0     3   11.2        -80.4
+    ...
+An optional 'header' column gives the header row of the polygon worksheet (defaults to 0).
+
+Every finished chunk is written to a checkpoint file so that a crashed batch carries on
+from where it stopped when it is run again with the same manifest, settings and workbooks.
+
+Usage:
+    python batch_runner.py manifest.csv -o results.csv --workers 8
+
+A .parquet output needs pyarrow or fastparquet installed, otherwise the results go to a .csv
+of the same name instead.
+
+Date Created: 18/10/2026"""
+
+import os
+import re
+import hashlib
+import argparse
+import importlib.util
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory, resource_tracker
+from background_harmonics import calc_amplification_points
+from network_polygons import (
+    Project, PolygonSet, worst_case_amplification, _file_hash,
+    sample_points_in_polygon, interpolate_boundary_points
+)
+from instrumentation import logger
+
+# constants
+MANIFEST_COLUMNS = ['site', 'scenario', 'polygon_file', 'polygon_sheet', 'Zbase', 'h', 'site_r_h', 'site_x_h']
+RESULT_COLUMNS = ['site', 'scenario', 'h', 'site_r_h', 'site_x_h', 'max_AF', 'max_R', 'max_X', 'p95_AF']
+POLYGON_COLUMNS = ['site', 'polygon_file', 'polygon_sheet', 'Zbase', 'header'] # rows sharing one set of polygons
+CHUNK_ORDERS = 7 # harmonic orders per work chunk, 49 orders split into 7 chunks
+PARQUET_ENGINES = ('pyarrow', 'fastparquet') # either is needed by pandas to write .parquet
+
+# shared memory blocks attached by this worker process, kept open between tasks
+_attached = {}
+
+def _attach_shared(name):
+    """Attaches to a shared memory block created by the parent process once per worker"""
+    if name not in _attached:
+        # the pool shares the parent's resource tracker, so the parent alone unlinks the block
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return _attached[name]
+
+def _chunk_key(site, chunk, settings, polygon_hash):
+    """Stable checkpoint name for a chunk from its inputs (manifest rows, settings and the
+    contents of the polygon workbook), so changed inputs are rerun"""
+    digest = hashlib.sha256((chunk.to_csv(index=False) + repr(settings) + polygon_hash).encode()).hexdigest()[:12]
+    safe_site = re.sub(r'[^A-Za-z0-9_-]+', '_', str(site))
+    return f"{safe_site}_h{chunk['h'].min()}-{chunk['h'].max()}_{digest}"
+
+def _run_chunk(shm_name, n_vertices, orders, offsets, chunk, num_points=1000, num_pts=100, seed=0, vertices=None):
+    """Worker task: evaluates every site impedance scenario of a (site, orders) chunk.
+    The network points of each order are sampled once and reused across all of the scenarios.
+    The polygon vertices are read from the shared memory block, or passed directly as 
+    vertices when running in process.
+
+    Returns:
+        DataFrame: one row of RESULT_COLUMNS per manifest row in the chunk
+    """
+    if shm_name:
+        shm = _attach_shared(shm_name)
+        vertices = np.ndarray((n_vertices, 2), dtype=np.float64, buffer=shm.buf)
+    project = Project()
+    project.polygons = PolygonSet(orders, offsets, vertices)
+
+    results = []
+    for h, rows in chunk.groupby('h', sort=True):
+        polygon = project.polygons.polygon(h)
+        points = np.vstack([
+            sample_points_in_polygon(polygon, num_points, rng=(seed, int(h)), polygon=project.polygons.geometry(h)),
+            interpolate_boundary_points(polygon, num_pts=num_pts),
+        ])
+        site_z = rows['site_r_h'].to_numpy(dtype=float) + 1j*rows['site_x_h'].to_numpy(dtype=float)
+        worst = worst_case_amplification(project, h=[h]*len(rows), site_z=site_z)
+        # scenarios down the rows, network points across the columns
+        AF = calc_amplification_points(
+            rows['site_x_h'].to_numpy(dtype=float)[:, None], rows['site_r_h'].to_numpy(dtype=float)[:, None],
+            points[None, :, 0], points[None, :, 1]
+        )
+        p95 = np.percentile(AF, 95, axis=1)
+        for i, row in enumerate(rows.itertuples(index=False)):
+            results.append([
+                row.site, row.scenario, int(h), row.site_r_h, row.site_x_h,
+                worst['AF'].iloc[i], worst['R'].iloc[i], worst['X'].iloc[i], p95[i]
+            ])
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+def _write_checkpoint(result, checkpoint):
+    # writing via a temporary file so a crash never leaves half a checkpoint
+    result.to_csv(checkpoint + '.tmp', index=False)
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+def _read_manifest(manifest):
+    manifest = pd.read_csv(manifest) if isinstance(manifest, str) else manifest.copy()
+    missing = [c for c in MANIFEST_COLUMNS if c not in manifest.columns]
+    assert not missing, f"The manifest is missing the columns {missing}!"
+    if 'header' not in manifest.columns:
+        manifest['header'] = 0
+    manifest['header'] = manifest['header'].fillna(0).astype(int)
+    # groupby drops rows with missing keys, so they would be skipped silently
+    blank = manifest[POLYGON_COLUMNS].isna().any(axis=1)
+    assert not blank.any(), f"The manifest rows {list(manifest.index[blank])} are missing their site or polygon inputs!"
+    manifest['h'] = manifest['h'].astype(int)
+    return manifest
+
+def results_filename(output):
+    """Filename the results are written to: output itself, or the .csv of the same name if
+    it is a .parquet and no parquet engine is installed. Checked before any work is done so
+    a long batch doesn't fail when it writes the results."""
+    if output.endswith('.parquet') and not any(importlib.util.find_spec(engine) for engine in PARQUET_ENGINES):
+        csv_output = os.path.splitext(output)[0] + '.csv'
+        logger.warning(f"Writing the results to {csv_output} instead of {output}, install pyarrow or fastparquet for .parquet")
+        return csv_output
+    return output
+
+def run_batch(manifest, output, workers=None, chunk_orders=CHUNK_ORDERS, num_points=1000, num_pts=100,
+              seed=0, checkpoint_dir=None):
+    """Function runs the amplification analysis for every row of a manifest and writes the
+    consolidated results to one table. For each site, scenario and order this reports the exact
+    maximum AF of the network polygon and where it occurs, and the 95th percentile AF over
+    num_points random points inside the polygon plus num_pts+1 points along its boundary.
+
+    Args:
+        manifest (str or DataFrame): CSV filename or DataFrame with MANIFEST_COLUMNS
+        output (str): .parquet or .csv filename for the consolidated results, see results_filename
+        workers (int, optional): number of worker processes, 0 runs everything in this
+            process. Defaults to None for the number of CPUs.
+        chunk_orders (int, optional): harmonic orders per work chunk. Defaults to CHUNK_ORDERS.
+        num_points (int, optional): random points inside each polygon. Defaults to 1000.
+        num_pts (int, optional): boundary divisions of each polygon. Defaults to 100.
+        seed (int, optional): seed of the point sampling. Defaults to 0.
+        checkpoint_dir (str, optional): folder for the per-chunk checkpoints.
+            Defaults to None for '<output>_checkpoints'.
+
+    Returns:
+        DataFrame: consolidated results with RESULT_COLUMNS
+    """
+    manifest = _read_manifest(manifest)
+    output = results_filename(output)
+    checkpoint_dir = checkpoint_dir or os.path.splitext(output)[0] + '_checkpoints'
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    settings = (num_points, num_pts, seed)
+
+    shared_blocks = []
+    futures = {}
+    done = []
+    executor = None
+    if workers != 0:
+        # starting the tracker before the pool forks so the workers share it with this process
+        resource_tracker.ensure_running()
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # the scenarios of a site can use different polygon workbooks, so each set of polygons is its own group
+        for (site, polygon_file, polygon_sheet, Zbase, header), site_rows in manifest.groupby(POLYGON_COLUMNS, sort=False):
+            polygon_hash = _file_hash(polygon_file)
+            # splitting the site's orders into chunks and skipping any finished in an earlier run
+            orders = sorted(site_rows['h'].unique())
+            chunks = []
+            for i in range(0, len(orders), chunk_orders):
+                chunk = site_rows[site_rows['h'].isin(orders[i:i+chunk_orders])][MANIFEST_COLUMNS + ['header']]
+                checkpoint = os.path.join(checkpoint_dir, _chunk_key(site, chunk, settings, polygon_hash) + '.csv')
+                done.append(checkpoint)
+                if not os.path.exists(checkpoint):
+                    chunks.append((chunk, checkpoint))
+            if not chunks:
+                continue
+
+            project = Project(name=site)
+            project.input_network_data(
+                input_filename=polygon_file, input_sheet=polygon_sheet, Zbase=Zbase, header=int(header)
+            )
+            polygons = project.polygons
+            if executor is None:
+                for chunk, checkpoint in chunks:
+                    _write_checkpoint(_run_chunk(
+                        None, len(polygons.vertices), polygons.orders, polygons.offsets, chunk,
+                        num_points, num_pts, seed, vertices=polygons.vertices
+                    ), checkpoint)
+                continue
+
+            # the workers read the polygons straight out of shared memory rather than a pickled copy
+            shm = shared_memory.SharedMemory(create=True, size=max(polygons.vertices.nbytes, 1))
+            shared_blocks.append(shm)
+            np.ndarray(polygons.vertices.shape, dtype=np.float64, buffer=shm.buf)[:] = polygons.vertices
+            for chunk, checkpoint in chunks:
+                future = executor.submit(
+                    _run_chunk, shm.name, len(polygons.vertices), polygons.orders, polygons.offsets, chunk,
+                    num_points, num_pts, seed
+                )
+                futures[future] = checkpoint
+
+        # checkpointing every chunk that finishes before raising the first failure, if any
+        failures = []
+        for future in as_completed(futures):
+            if future.exception() is None:
+                _write_checkpoint(future.result(), futures[future])
+            else:
+                failures.append(future.exception())
+        if failures:
+            raise failures[0]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for shm in shared_blocks:
+            shm.close()
+            shm.unlink()
+
+    results = pd.DataFrame([], columns=RESULT_COLUMNS)
+    if done:
+        results = pd.concat([pd.read_csv(checkpoint) for checkpoint in done], ignore_index=True)
+    if output.endswith('.parquet'):
+        results.to_parquet(output, index=False)
+    else:
+        results.to_csv(output, index=False)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch background harmonic amplification analysis.")
+    parser.add_argument('manifest', help="CSV manifest of sites, polygon files, orders and site impedances")
+    parser.add_argument('-o', '--output', default='amplification_results.csv', help=".parquet or .csv results table")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes, 0 to run in process")
+    parser.add_argument('--chunk-orders', type=int, default=CHUNK_ORDERS, help="harmonic orders per work chunk")
+    parser.add_argument('--num-points', type=int, default=1000, help="random points inside each polygon")
+    parser.add_argument('--num-pts', type=int, default=100, help="boundary divisions of each polygon")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the point sampling")
+    parser.add_argument('--checkpoint-dir', default=None, help="folder for the per-chunk checkpoints")
+    args = parser.parse_args(argv)
+    output = results_filename(args.output)
+    results = run_batch(
+        args.manifest, output, workers=args.workers, chunk_orders=args.chunk_orders,
+        num_points=args.num_points, num_pts=args.num_pts, seed=args.seed, checkpoint_dir=args.checkpoint_dir
+    )
+    print(f"Wrote {len(results)} results to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Benchmark suite for the hot paths of the harmonic analysis: the solution space grid and
+AF calculation, ingesting the network polygon workbook, interpolating and sampling points
+on the network polygons and writing the interactive html plots.
+
+Each benchmark is run a few times and the fastest time is kept. The results can be saved as
+a JSON baseline and later runs compared against it, failing when any benchmark has slowed
+down by more than the threshold (or its own threshold in the baseline).
+
+Usage:
+    python benchmarks/run_benchmarks.py                                # print the timings
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --threshold 1.5
+
+Date Created: 18/10/2026"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from background_harmonics import gen_soln_space, calc_amplification, calc_amplification_batch
+from network_polygons import Project, H_ORDERS_RANGE
+from synthetic_data import synthetic_polygons, write_synthetic_workbook
+
+# constants
+REPEATS = 3 # runs per benchmark, the fastest is reported
+THRESHOLD = 1.25 # allowed slow down against the baseline before a benchmark fails
+
+BENCHMARKS = {}
+
+def benchmark(name, repeats=REPEATS):
+    """Decorator that registers a benchmark. The function sets up its inputs and returns
+    the callable to time, so setup is not counted."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeats)
+        return setup
+    return register
+
+def _project():
+    project = Project(name="benchmark")
+    polygons = synthetic_polygons()
+    project.polygon_data_dict = {
+        h: pd.DataFrame({f"R{h}": polygons[h][:, 0], f"X{h}": polygons[h][:, 1]}) for h in H_ORDERS_RANGE
+    }
+    return project
+
+def _soln_space(step):
+    def setup():
+        def run():
+            R, X, R_range, X_range = gen_soln_space(xspan=[0,1000], yspan=[-1000,1000], step=step)
+            calc_amplification(site_x_h=-344.2, site_r_h=42.1, R=R, X=X, h=14)
+        return run
+    return setup
+
+for _step in (2.0, 1.0, 0.5):
+    benchmark(f"soln_space_step_{_step}")(_soln_space(_step))
+
+@benchmark("soln_space_batch_49_orders_step_2.0")
+def _batch():
+    R, X, R_range, X_range = gen_soln_space(xspan=[0,1000], yspan=[-1000,1000], step=2.0)
+    site_r_h = np.linspace(5.0, 80.0, len(H_ORDERS_RANGE))
+    site_x_h = np.linspace(-600.0, 600.0, len(H_ORDERS_RANGE))
+    return lambda: calc_amplification_batch(site_x_h, site_r_h, R_range, X_range)
+
+def _ingest(use_cache):
+    def setup():
+        folder = tempfile.mkdtemp()
+        filename = write_synthetic_workbook(os.path.join(folder, "synthetic.xlsx"))
+        Project().input_network_data(filename, "polygon", Zbase=1.0, header=1, use_cache=use_cache)
+        return lambda: Project().input_network_data(filename, "polygon", Zbase=1.0, header=1, use_cache=use_cache)
+    return setup
+
+benchmark("input_network_data_excel")(_ingest(False))
+benchmark("input_network_data_cached")(_ingest(True))
+
+def _interpolate(num_pts):
+    def setup():
+        project = _project()
+        return lambda: project.interpolate_polygon_points(14, num_pts=num_pts)
+    return setup
+
+def _sample(num_points):
+    def setup():
+        project = _project()
+        return lambda: project.generate_random_points_inside_polygon(14, num_points=num_points, rng=0)
+    return setup
+
+for _n in (100, 1000, 10000):
+    benchmark(f"interpolate_polygon_points_{_n}")(_interpolate(_n))
+
+for _n in (1000, 10000, 100000):
+    benchmark(f"generate_random_points_inside_polygon_{_n}")(_sample(_n))
+
+@benchmark("plot_soln_space_html_step_2.0", repeats=1)
+def _plot():
+    from plotter import plot_soln_space
+    project = _project()
+    R, X, R_range, X_range = gen_soln_space(xspan=[0,1000], yspan=[-1000,1000], step=2.0)
+    AF = calc_amplification_batch(-344.2, 42.1, R_range, X_range)[0]
+    folder = tempfile.mkdtemp()
+
+    def run():
+        with _cwd(folder):
+            plot_soln_space(
+                R_range, X_range, AF, site_r_h=42.1, site_x_h=-344.2, plotter_r=42.0, plotter_x=-344.0,
+                h=14, polygon=project.polygon_data_dict[14].copy(), filename="benchmark"
+            )
+    return run
+
+@contextlib.contextmanager
+def _cwd(folder):
+    previous = os.getcwd()
+    os.chdir(folder)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def run_benchmarks(names=None):
+    """Runs the registered benchmarks and returns the fastest time of each in seconds"""
+    results = {}
+    for name, (setup, repeats) in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        # keeping the prints from the code under test out of the timings and the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = setup()
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+        results[name] = min(times)
+        print(f"{name:<50} {min(times)*1000:>10.2f} ms")
+    return results
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Compares the results with a baseline and returns the benchmarks that slowed down
+    by more than the threshold (or the benchmark's own 'threshold' in the baseline)"""
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        limit = reference.get('threshold', threshold)*reference['seconds']
+        ratio = seconds/reference['seconds']
+        status = "REGRESSION" if seconds > limit else "ok"
+        print(f"{name:<50} {ratio:>6.2f}x baseline  {status}")
+        if seconds > limit:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the harmonic analysis hot paths.")
+    parser.add_argument('-k', dest='names', nargs='*', help="only run benchmarks whose names contain these")
+    parser.add_argument('--save', help="write the timings to this JSON baseline")
+    parser.add_argument('--compare', help="compare against this JSON baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed slow down ratio")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({name: {'seconds': round(seconds, 6), 'threshold': args.threshold} for name, seconds in results.items()}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), threshold=args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
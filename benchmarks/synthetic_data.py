@@ -0,0 +1,38 @@
+"""Synthetic network polygon data for the benchmarks so that they run offline without any
+NSP data. The polygons are random star-shaped polygons (vertices at sorted angles around a
+centre) and the workbook is written in the same layout as the NSP spreadsheets read by
+Project.input_network_data.
+
+Date Created: 18/10/2026"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from network_polygons import H_ORDERS_RANGE
+
+def synthetic_polygon(n_vertices=12, centre=(200.0, 50.0), radius=(50.0, 300.0), rng=None):
+    """Random star-shaped polygon as an (n_vertices, 2) array of R, X"""
+    rng = np.random.default_rng(rng)
+    angles = np.sort(rng.uniform(0, 2*np.pi, n_vertices))
+    radii = rng.uniform(radius[0], radius[1], n_vertices)
+    R = np.abs(centre[0] + radii*np.cos(angles))
+    X = centre[1] + radii*np.sin(angles)
+    return np.column_stack([R, X])
+
+def synthetic_polygons(n_vertices=12, rng=0):
+    """Random polygon for every harmonic order 2-50 as a dict of arrays keyed by order"""
+    rng = np.random.default_rng(rng)
+    return {h: synthetic_polygon(n_vertices, centre=(20.0*h, 10.0*h), rng=rng) for h in H_ORDERS_RANGE}
+
+def write_synthetic_workbook(filename, n_vertices=12, sheet="polygon", rng=0):
+    """Writes the synthetic polygons as an NSP style workbook with 'Harmonic #h' and R / X
+    header rows. Read back with input_network_data(..., header=1)."""
+    polygons = synthetic_polygons(n_vertices=n_vertices, rng=rng)
+    header_h = [''] + [f"Harmonic #{h}" if c == 'R' else '' for h in H_ORDERS_RANGE for c in 'RX']
+    header_rx = [''] + [c for _ in H_ORDERS_RANGE for c in 'RX']
+    rows = [[f"Point {i+1}"] + [polygons[h][i, j] for h in H_ORDERS_RANGE for j in range(2)] for i in range(n_vertices)]
+    pd.DataFrame([header_h, header_rx] + rows).to_excel(filename, sheet_name=sheet, index=False, header=False)
+    return filename
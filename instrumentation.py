@@ -0,0 +1,186 @@
+"""Script that contains the timing and metrics instrumentation used around the hot paths of the
+harmonic analysis (ingest, grid build, AF calculation, sampling and plotting). Sections are
+timed with the timer() context manager or the timed() decorator, which also count the points
+handled so that throughput can be reported, and optionally track the peak memory allocated
+inside the section with tracemalloc. The metrics are written out as JSON or as a Prometheus
+textfile rather than printed.
+
+Instrumentation is off by default, in which case the timers do nothing but check a flag.
+Progress messages go through the 'harmonics' logger instead of print.
+
+Example:
+    import instrumentation
+    instrumentation.enable(track_memory=True)
+    ... run the analysis ...
+    instrumentation.write_json("metrics.json")
+
+Date Created: 18/10/2026"""
+
+import os
+import json
+import time
+import logging
+import cProfile
+import functools
+import contextlib
+import tracemalloc
+
+logger = logging.getLogger("harmonics")
+
+class _State():
+    enabled = False
+    track_memory = False
+    sections = {}
+    memory_stack = [] # sections open while tracking memory, innermost last
+
+_state = _State()
+
+def enable(track_memory=False):
+    """Turns the instrumentation on, optionally with tracemalloc peak memory tracking"""
+    _state.enabled = True
+    _state.track_memory = track_memory
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    """Turns the instrumentation off, the recorded metrics are kept until reset()"""
+    _state.enabled = False
+    if _state.track_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state.track_memory = False
+    _state.memory_stack = []
+
+def reset():
+    """Clears the recorded metrics"""
+    _state.sections = {}
+
+def _record(name, seconds, points, peak_memory):
+    section = _state.sections.setdefault(
+        name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'points': 0, 'peak_memory_bytes': 0}
+    )
+    section['calls'] += 1
+    section['seconds'] += seconds
+    section['max_seconds'] = max(section['max_seconds'], seconds)
+    section['points'] += int(points or 0)
+    section['peak_memory_bytes'] = max(section['peak_memory_bytes'], peak_memory)
+
+class _Timer():
+    """Times one section. points can be set inside the with block once they are known."""
+    __slots__ = ('name', 'points', '_start', '_memory_start', '_peak')
+
+    def __init__(self, name, points=None) -> None:
+        self.name = name
+        self.points = points
+
+    def __enter__(self):
+        if _state.track_memory:
+            # tracemalloc has a single peak, so the outer section keeps the peak reached so far
+            # before this section resets it, and takes this section's peak back on exit
+            current, peak = tracemalloc.get_traced_memory()
+            if _state.memory_stack:
+                parent = _state.memory_stack[-1]
+                parent._peak = max(parent._peak, peak)
+            tracemalloc.reset_peak()
+            self._memory_start = self._peak = current
+            _state.memory_stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        peak_memory = 0
+        if _state.track_memory and _state.memory_stack and _state.memory_stack[-1] is self:
+            _state.memory_stack.pop()
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            peak_memory = max(0, self._peak - self._memory_start)
+            if _state.memory_stack:
+                parent = _state.memory_stack[-1]
+                parent._peak = max(parent._peak, self._peak)
+        _record(self.name, seconds, self.points, peak_memory)
+        return False
+
+class _NoTimer():
+    """Stand in for _Timer when the instrumentation is off"""
+    __slots__ = ()
+    points = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NO_TIMER = _NoTimer()
+
+def timer(name, points=None):
+    """Context manager that times a section, e.g.
+        with timer("af_compute", points=R.size):
+            ...
+    """
+    return _Timer(name, points) if _state.enabled else _NO_TIMER
+
+def timed(name, count=None):
+    """Decorator that times every call of a function as a section. count is an optional
+    function of the return value giving the number of points handled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with _Timer(name) as section:
+                result = func(*args, **kwargs)
+                section.points = count(result) if count else None
+            return result
+        return wrapper
+    return decorator
+
+def metrics():
+    """Recorded metrics per section with the throughput in points per second"""
+    return {
+        name: dict(section, points_per_second=section['points']/section['seconds'] if section['seconds'] else 0.0)
+        for name, section in _state.sections.items()
+    }
+
+def _write_atomic(filename, text):
+    with open(filename + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(filename + '.tmp', filename)
+
+def write_json(filename):
+    """Writes the metrics as JSON keyed by section"""
+    _write_atomic(filename, json.dumps(metrics(), indent=2))
+
+_PROMETHEUS_METRICS = [
+    ('calls', 'harmonics_section_calls_total', 'counter', 'Number of times the section ran'),
+    ('seconds', 'harmonics_section_seconds_total', 'counter', 'Total time spent in the section'),
+    ('max_seconds', 'harmonics_section_max_seconds', 'gauge', 'Longest single run of the section'),
+    ('points', 'harmonics_section_points_total', 'counter', 'Impedance points handled by the section'),
+    ('points_per_second', 'harmonics_section_points_per_second', 'gauge', 'Throughput of the section'),
+    ('peak_memory_bytes', 'harmonics_section_peak_memory_bytes', 'gauge', 'Peak memory allocated in the section'),
+]
+
+def write_prometheus(filename):
+    """Writes the metrics in the Prometheus textfile collector format"""
+    sections = metrics()
+    lines = []
+    for key, metric, kind, description in _PROMETHEUS_METRICS:
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{section="{name}"}} {section[key]}' for name, section in sections.items()]
+    _write_atomic(filename, "\n".join(lines) + "\n")
+
+@contextlib.contextmanager
+def profiled(filename=None):
+    """Runs the block under cProfile and dumps the stats to filename (for snakeviz, pstats
+    etc.). The timed sections are plain Python functions, so they also show up by name
+    when sampling with py-spy instead."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if filename:
+            profiler.dump_stats(filename)
@@ -0,0 +1,31 @@
+"""Deferred imports of the heavy optional libraries (plotly, matplotlib, shapely) so that
+importing the numeric functions doesn't pay for them. The module is only imported the first
+time one of its attributes is used, e.g.
+
+    plt = lazy_import("matplotlib.pyplot")
+    ...
+    fig, ax = plt.subplots()   # matplotlib is imported here
+
+Date Created: 18/10/2026"""
+
+import importlib
+
+class _LazyModule():
+    """Stand in for a module that imports it on first attribute access"""
+    __slots__ = ('_name', '_module')
+
+    def __init__(self, name) -> None:
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{' (loaded)' if self._module is not None else ''}>"
+
+def lazy_import(name):
+    """Returns a stand in for module name that is imported on first use"""
+    return _LazyModule(name)
@@ -1,94 +1,133 @@
 """The following script runs harmonic analysis using the functions in this repository.
+Importing it has no side effects; run it from the command line or call main().
+
+Usage:
+    python main.py --workdir ./testing --polygon-file test_data.xlsx --h 14
 
 Created by: Inez Zheng (@zeniconcombres)
 Created on: 11/12/23
 """
 
-import sys, os
-import pandas as pd 
-from pandas import DataFrame as df
-# reading in all the functions from the specialised scripts 
-from background_harmonics import *
-from plotter import *
-from network_polygons import *
+import os
+import sys
+import argparse
+import logging
+import pandas as pd
+from background_harmonics import gen_soln_space, calc_amplification
+from network_polygons import Project
+from operating_points import operating_point_amplification_csv
+
+logger = logging.getLogger("harmonics")
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Background harmonic amplification analysis for one site.")
+    #### WORKING DIRECTORY ####
+    parser.add_argument('--workdir', default="./testing", help="folder with the input data, outputs are written here")
+    #### INPUTS ####
+    # site impedance
+    parser.add_argument('--site-x', type=float, default=-344.203565, help="site X in Ohms")
+    parser.add_argument('--site-r', type=float, default=42.058105, help="site R in Ohms")
+    parser.add_argument('--h', type=int, default=14, help="harmonic order")
+    # Network impedance range to be scanned across
+    parser.add_argument('--x-range', type=float, nargs=2, default=[-1000, 1000], help="network X range in Ohms")
+    parser.add_argument('--r-range', type=float, nargs=2, default=[0, 1000], help="network R range in Ohms")
+    parser.add_argument('--step', type=float, default=1.0, help="grid step in Ohms")
+    # network polygons
+    parser.add_argument('--polygon-file', default="test_data.xlsx", help="NSP network polygon spreadsheet")
+    parser.add_argument('--polygon-sheet', default="polygon", help="worksheet with the network polygons")
+    parser.add_argument('--base', type=float, default=100.0, help="base the network polygon data is given in")
+    parser.add_argument('--sampling-method', default="rejection",
+                        choices=["rejection", "triangulation", "sobol", "halton", "stratified"],
+                        help="how points inside the network polygon are sampled")
+    # operating points
+    parser.add_argument('--operating-points', help="CSV of site impedance operating points (R{h}, X{h} columns) to sweep")
+    # Plots
+    parser.add_argument('--filename', default='amplification_plot', help="prefix of the plot files")
+    parser.add_argument('--no-plot', dest='plot_figure', action='store_false', help="skip the interactive AF plot")
+    parser.add_argument('--no-print', dest='print_figure', action='store_false', help="skip the polygon figures")
+    return parser.parse_args(argv)
 
-#### WORKING DIRECTORY ####
-os.chdir(r"./testing")
+def main(argv=None):
+    args = _parse_args(argv)
+    # progress messages from the functions go through the 'harmonics' logger
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    os.chdir(args.workdir)
 
-#### INPUTS ####
-# site impedance
-# x_h = 100.0 # Ohms
-# r_h = 10.0 # Ohms
-x_h = -344.203565 # Ohms
-r_h = 42.058105 # Ohms
-v_bkg_h = 0.5 # %
-h = 14 # th order harmonic
+    x_h, r_h, h = args.site_x, args.site_r, args.h
+    print_figure = args.print_figure
 
-# Network impedance range to be scanned across
-x_range = [-1000,1000]
-r_range = [0,1000]
-step = 1.0
+    ########## CALCULATING THE BACKGROUND HARMONICS ##########
+    R, X, R_range, X_range = gen_soln_space(xspan=args.r_range, yspan=args.x_range, step=args.step)
+    AF = calc_amplification(site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75, R=R, X=X, h=h)
 
-# Plots
-filename = 'amplification_plot'
-plot_figure = False
-print_figure = False
-plot_figure = True
-print_figure = True
+    ########### READING IN NETWORK POLYGONS ################
+    ibr_project = Project(name="Puffer Fish")
+    ibr_project.input_network_data(input_filename=args.polygon_file, input_sheet=args.polygon_sheet, Zbase=args.base)
+    # showing a single harmonic order polygon that's used as a demo
+    ibr_h = ibr_project.polygon_data_dict[h]
+    logger.info(ibr_h.head())
 
-########## CALCULATING THE BACKGROUND HARMONICS ##########
-R, X, R_range, X_range = gen_soln_space(xspan=r_range, yspan=x_range, step=step)
-AF = calc_amplification(site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75, R=R, X=X, h=h)
+    #### calculating network polygon amplification points ######
+    logger.info("CORNER POINTS")
+    network_poly_cnr_pt_AF = calc_amplification(
+        site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75,
+        R=ibr_h[f'R{h}'], X=ibr_h[f'X{h}'], h=h
+    )
+    # interpolating points between the polygon corner points and calculating AF for these points
+    logger.info("BOUNDARY SWEEP")
+    interpolated_pts = ibr_project.interpolate_polygon_points(h, num_pts=100, print_figure=print_figure)
+    network_poly_boundary_AF = calc_amplification(
+        site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75,
+        R=interpolated_pts[f'R{h}'], X=interpolated_pts[f'X{h}'], h=h
+    )
+    # generating points inside the network polygon and calculating AF for each point inside
+    logger.info("AREA SWEEP")
+    points_inside = ibr_project.generate_random_points_inside_polygon(
+        h, print_figure=print_figure, method=args.sampling_method
+    )
+    network_poly_inside_AF = calc_amplification(
+        site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75,
+        R=points_inside[f'R{h}'], X=points_inside[f'X{h}'], h=h
+    )
+    logger.info(f"The 95th percentile AF inside the polygon is: {network_poly_inside_AF.quantile(q=0.95)}")
+    polygon_data = pd.concat([points_inside, interpolated_pts], axis=0)
+    polygon_data["AF"] = pd.concat([network_poly_inside_AF, network_poly_boundary_AF], axis=0)
+    logger.info(f"The 95th percentile AF for h={h} is: {polygon_data['AF'].quantile(q=0.95)}")
+    if print_figure:
+        _plot_polygon_AF(polygon_data, ibr_h, h)
 
-########### READING IN NETWORK POLYGONS ################
-network_polygon_file = "test_data.xlsx"
-polygon_worksheet = "polygon"
-base = 100.0 #MVA
-# network_polygon_file = 'harmonic_polygons.xlsx'
-ibr_project = Project(name="Puffer Fish")
-ibr_project.input_network_data(input_filename=network_polygon_file, input_sheet=polygon_worksheet, base=base)
-# showing a single harmonic order polygon that's used as a demo
-ibr_h14 = ibr_project.polygon_data_dict[14]
-print(ibr_h14.head())
-# fig, ax = ibr_project.plot_harmonic_polygon(14)
-# fig.savefig("test_polygon.png")
+    #### sweeping the site operating points against the same network points ######
+    if args.operating_points:
+        logger.info("OPERATING POINT SWEEP")
+        operating_points_AF = operating_point_amplification_csv(
+            ibr_project, h, args.operating_points, output_filename=f"operating_points_AF_h{h}.csv"
+        )
+        logger.info(f"The worst operating point AF for h={h} is: {operating_points_AF['max_AF'].max()}")
 
-#### calculating network polygon amplification points ######
-print("CORNER POINTS")
-network_poly_cnr_pt_AF = calc_amplification(
-    site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75, 
-    R=ibr_h14['R14'], X=ibr_h14['X14'], h=h
-)
-# interpolating points between the polygon corner points and calculating AF for these points
-print("BOUNDARY SWEEP")
-interpolated_pts_14 = ibr_project.interpolate_polygon_points(h, num_pts=100, print_figure=print_figure)
-network_poly_boundary_AF = calc_amplification(
-    site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75, 
-    R=interpolated_pts_14['R14'], X=interpolated_pts_14['X14'], h=h
-)
-# print(network_poly_all_AF.tail())
-# generating points inside the network polygon and calculating AF for each point inside
-print("AREA SWEEP")
-h14_points_inside = ibr_project.generate_random_points_inside_polygon(h, print_figure=print_figure)
-network_poly_inside_AF = calc_amplification(
-    site_x_h=x_h, site_r_h=r_h, v_bkg_h=0.75, 
-    R=h14_points_inside['R14'], X=h14_points_inside['X14'], h=h
-)
-print(f"The 95th percentile AF inside the polygon is: {network_poly_inside_AF.quantile(q=0.95)}")
-polygon_data_h14 = pd.concat([h14_points_inside,interpolated_pts_14],axis=0)
-polygon_data_h14["AF"] = pd.concat([network_poly_inside_AF,network_poly_boundary_AF],axis=0)
-print(f"The 95th percentile AF for h={h} is: {polygon_data_h14['AF'].quantile(q=0.95)}")
-if print_figure: 
-    # plot out the figure to show the network points
+    ########### PLOTTING THE RESULTS ##################
+    if args.plot_figure:
+        from plotter import plot_soln_space
+        plot_soln_space(
+            R_range, X_range, AF, h=h,
+            site_r_h=r_h, site_x_h=x_h,
+            plotter_r=r_h, plotter_x=x_h,
+            polygon=ibr_project.polygon_data_dict[h].copy(),
+            filename=args.filename+'_{:02d}'.format(h)
+        )
+    return 0
+
+def _plot_polygon_AF(polygon_data, polygon, h):
+    """plot out the figure to show the network points coloured by AF band"""
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(1,1)
-    h14_AF_l1 = polygon_data_h14[['R14','X14']].where(polygon_data_h14['AF']<=1.0)
-    ax.plot(h14_AF_l1['R14'], h14_AF_l1['X14'], marker='o', label='AF<=1', c='green', linestyle='none')
-    h14_AF_btw1n2 = polygon_data_h14[['R14','X14']].where(
-        polygon_data_h14['AF']>1.0).where(polygon_data_h14['AF']<2.0)
-    ax.plot(h14_AF_btw1n2['R14'], h14_AF_btw1n2['X14'], marker='o', label='1<AF<=2', c='orange', linestyle='none')
-    h14_AF_g2 = polygon_data_h14[['R14','X14']].where(polygon_data_h14['AF']>2.0)
-    ax.plot(h14_AF_g2['R14'], h14_AF_g2['X14'], marker='o', label='AF>2', c='red', linestyle='none')
-    ax.plot(ibr_h14['R14'].to_list() + [ibr_h14['R14'][0]], ibr_h14['X14'].to_list() + [ibr_h14['X14'][0]], 
+    AF_l1 = polygon_data[[f'R{h}',f'X{h}']].where(polygon_data['AF']<=1.0)
+    ax.plot(AF_l1[f'R{h}'], AF_l1[f'X{h}'], marker='o', label='AF<=1', c='green', linestyle='none')
+    AF_btw1n2 = polygon_data[[f'R{h}',f'X{h}']].where(
+        polygon_data['AF']>1.0).where(polygon_data['AF']<2.0)
+    ax.plot(AF_btw1n2[f'R{h}'], AF_btw1n2[f'X{h}'], marker='o', label='1<AF<=2', c='orange', linestyle='none')
+    AF_g2 = polygon_data[[f'R{h}',f'X{h}']].where(polygon_data['AF']>2.0)
+    ax.plot(AF_g2[f'R{h}'], AF_g2[f'X{h}'], marker='o', label='AF>2', c='red', linestyle='none')
+    ax.plot(polygon[f'R{h}'].to_list() + [polygon[f'R{h}'][0]], polygon[f'X{h}'].to_list() + [polygon[f'X{h}'][0]],
             marker='o', label='Polygon Vertices', linestyle='-', color='blue')
     # labels and axis
     ax.set_xlabel('R (Ohms)')
@@ -97,16 +136,7 @@ if print_figure:
     ax.legend()
     fig.tight_layout()
     fig.savefig(f"polygon_AF_plot_h{h}.png")
-    # plt.show()
-
-########### PLOTTING THE RESULTS ##################
-sensitivity_r = int(r_h)
-sensitivity_x = int(x_h)
+    return fig, ax
 
-plot_soln_space(
-    R_range, X_range, AF, h=h,
-    site_r_h=r_h, site_x_h=x_h,
-    plotter_r=sensitivity_r, plotter_x=sensitivity_x,
-    polygon=ibr_project.polygon_data_dict[h],
-    filename=filename+'_{:02d}'.format(h)
-) if plot_figure else None
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
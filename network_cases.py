@@ -0,0 +1,180 @@
+"""Script that aggregates the network polygons of many network cases (N-1 contingencies,
+seasons, ...) for the same harmonic orders, so the worst case over all of the cases is found
+with one sweep per order instead of one per case. The polygons of every case are merged per
+order with vectorised shapely 2 operations, either as their union (overlapping area is only
+counted once) or as their convex envelope, and the merged region is sampled and swept. The
+sampling work per order then scales with the distinct area rather than the number of cases.
+
+Each case is a Project (or PolygonSet) with the polygons of that case read in, e.g.
+    cases = {name: Project(name) for name in ["system normal", "line 1 out", "summer"]}
+    for name, case in cases.items():
+        case.input_network_data(f"{name}.xlsx", "polygon", Zbase=1.0)
+    merged = merge_case_polygons(cases, method="union")
+
+Date Created: 18/10/2026"""
+
+import numpy as np
+from pandas import DataFrame as df
+from background_harmonics import calc_amplification_points
+from network_polygons import PolygonSet, _rejection_sample
+from instrumentation import timed
+from lazy_imports import lazy_import
+from streaming_stats import PERCENTILES
+
+shapely = lazy_import("shapely")
+
+# constants
+MERGE_METHODS = ("union", "convex")
+
+def _polygon_sets(cases):
+    """PolygonSet of each case from a list or dict of Projects / PolygonSets"""
+    cases = cases.values() if isinstance(cases, dict) else cases
+    return [case if isinstance(case, PolygonSet) else case.polygons for case in cases]
+
+def case_polygons(cases, h):
+    """Function builds the shapely polygons of harmonic order h of every case that has it in a
+    single vectorised call from the ragged corner point arrays.
+
+    Args:
+        cases (list or dict): Projects or PolygonSets of the network cases
+        h (int): harmonic order
+
+    Returns:
+        numpy.ndarray: shapely Polygons, one per case with a polygon for h
+    """
+    vertices = [polygons.polygon(h) for polygons in _polygon_sets(cases) if h in polygons]
+    if not vertices:
+        return np.empty(0, dtype=object)
+    # shapely closes each ring itself, so the corner points go in as they are
+    rings = shapely.linearrings(np.concatenate(vertices), indices=np.repeat(np.arange(len(vertices)), [len(v) for v in vertices]))
+    return shapely.polygons(rings)
+
+@timed("merge_cases")
+def merge_case_polygons(cases, orders=None, method="union"):
+    """Function merges the polygons of every case per harmonic order.
+
+    Args:
+        cases (list or dict): Projects or PolygonSets of the network cases
+        orders (list, optional): harmonic orders to merge. Defaults to None for every order in any case.
+        method (str, optional): "union" keeps exactly the impedances covered by at least one case
+            (and can be a MultiPolygon), "convex" is the convex envelope of all of the cases, a
+            single polygon that also covers the impedances in between. Defaults to "union".
+
+    Returns:
+        dict: prepared shapely geometry of the merged region keyed by harmonic order
+    """
+    assert method in MERGE_METHODS, f"Unknown merge method {method}, use one of {MERGE_METHODS}!"
+    polygon_sets = _polygon_sets(cases)
+    if orders is None:
+        orders = sorted({h for polygons in polygon_sets for h in polygons})
+    merged = {}
+    for h in orders:
+        polygons = case_polygons(polygon_sets, h)
+        assert len(polygons), f"None of the cases have a polygon for h={h}!"
+        if method == "union":
+            # NSP polygons can self intersect, which would make the union fail
+            region = shapely.union_all(shapely.make_valid(polygons))
+        else:
+            region = shapely.convex_hull(shapely.union_all(shapely.get_exterior_ring(polygons)))
+        shapely.prepare(region)
+        merged[int(h)] = region
+    return merged
+
+@timed("sampling", count=len)
+def sample_points_in_region(region, num_points, rng=None):
+    """Function generates uniformly distributed random points inside a merged region (which
+    can have several parts and holes) by rejection sampling its bounding box in bulk.
+
+    Args:
+        region (shapely geometry): prepared polygonal region
+        num_points (int): number of points to generate
+        rng (numpy.random.Generator or int, optional): generator or seed. Defaults to None.
+
+    Returns:
+        numpy.ndarray: (num_points, 2) array of R, X points
+    """
+    rng = np.random.default_rng(rng)
+    bounds = np.asarray(shapely.bounds(region))
+    min_xy, max_xy = bounds[:2], bounds[2:]
+    box_area = float(np.prod(max_xy - min_xy))
+    acceptance = shapely.area(region)/box_area if box_area else 0.0
+    assert acceptance > 0, "The region has no area to sample points from!"
+    def candidates(n):
+        return rng.uniform(min_xy, max_xy, size=(n, 2))
+    def inside(points):
+        return shapely.contains_xy(region, points[:, 0], points[:, 1])
+    return _rejection_sample(candidates, inside, num_points, acceptance)[:num_points]
+
+@timed("sampling_boundary", count=len)
+def region_boundary_points(region, num_pts=100):
+    """Function places about num_pts points evenly along the whole boundary of a merged
+    region, sharing them between its rings (parts and holes) by length.
+
+    Args:
+        region (shapely geometry): polygonal region
+        num_pts (int, optional): number of boundary divisions. Defaults to 100.
+
+    Returns:
+        numpy.ndarray: (m, 2) array of R, X points along the boundary
+    """
+    rings = shapely.get_parts(shapely.boundary(region))
+    lengths = shapely.length(rings)
+    counts = np.maximum(1, np.round(num_pts*lengths/lengths.sum()).astype(int))
+    # each ring is walked from its start, which is also its end, so no point is repeated
+    distances = np.concatenate([np.arange(n)*length/n for n, length in zip(counts, lengths)])
+    points = shapely.line_interpolate_point(np.repeat(rings, counts), distances)
+    return shapely.get_coordinates(points)
+
+def region_network_points(region, num_points=1000, num_pts=100, rng=None):
+    """Boundary and interior network points of a merged region as an (n, 2) array of R, X,
+    in the same form as operating_points.network_points for sweep_operating_points"""
+    return np.concatenate([region_boundary_points(region, num_pts=num_pts), sample_points_in_region(region, num_points, rng=rng)])
+
+def _per_order(value, h):
+    return value[h] if isinstance(value, dict) else value
+
+@timed("merged_case_amplification")
+def merged_case_amplification(cases, site_x_h, site_r_h, orders=None, method="union", num_points=1000,
+                              num_pts=100, rng=None, percentiles=PERCENTILES):
+    """Function finds the amplification factor over all of the network cases per harmonic order
+    by sweeping the merged region once. The maximum is exact, as in worst_case_amplification:
+    the point of the region nearest to the resonance point -Zs (unbounded if -Zs is inside).
+    The percentiles come from the sampled boundary and interior points of the region.
+
+    Args:
+        cases (list or dict): Projects or PolygonSets of the network cases
+        site_x_h (float or dict): site inductance / capacitance in Ohms (X), or one per order
+        site_r_h (float or dict): site resistance in Ohms (R), or one per order
+        orders (list, optional): harmonic orders. Defaults to None for every order in any case.
+        method (str, optional): "union" or "convex", see merge_case_polygons. Defaults to "union".
+        num_points (int, optional): random points inside each merged region. Defaults to 1000.
+        num_pts (int, optional): boundary divisions of each merged region. Defaults to 100.
+        rng (numpy.random.Generator or int, optional): generator or seed. Defaults to None.
+        percentiles (list, optional): percentiles to report. Defaults to PERCENTILES.
+
+    Returns:
+        DataFrame: 'n_cases', 'case_area' (summed over the cases), 'area' (of the merged region),
+            'max_AF', 'max_R', 'max_X' and 'p{q}_AF' indexed by harmonic order 'h'
+    """
+    rng = np.random.default_rng(rng)
+    polygon_sets = _polygon_sets(cases)
+    merged = merge_case_polygons(polygon_sets, orders=orders, method=method)
+
+    results = []
+    for h, region in merged.items():
+        x_h, r_h = float(_per_order(site_x_h, h)), float(_per_order(site_r_h, h))
+        resonance = shapely.points(-r_h, -x_h)
+        if shapely.intersects(region, resonance):
+            max_af, max_r, max_x = np.inf, -r_h, -x_h
+        else:
+            max_r, max_x = shapely.get_coordinates(shapely.shortest_line(region, resonance))[0]
+            dist = shapely.distance(region, resonance)
+            max_af = np.hypot(r_h, x_h)/dist if dist else np.inf
+
+        points = region_network_points(region, num_points=num_points, num_pts=num_pts, rng=rng)
+        af = calc_amplification_points(x_h, r_h, points[:, 0], points[:, 1])
+        case_areas = shapely.area(case_polygons(polygon_sets, h))
+        results.append([h, len(case_areas), float(case_areas.sum()), float(shapely.area(region)), max_af, max_r, max_x]
+                       + list(np.percentile(af, percentiles)))
+    columns = ['h', 'n_cases', 'case_area', 'area', 'max_AF', 'max_R', 'max_X'] + [f"p{q:g}_AF" for q in percentiles]
+    return df(results, columns=columns).set_index('h')
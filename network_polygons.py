@@ -7,33 +7,500 @@ into an object class with different site specific data attached to it
 Author: Inez Zheng (@zeniconcombres)
 Date Created: 16/01/2024"""
 
+import os
+import json
+import hashlib
+from types import MappingProxyType
+import logging
 import pandas as pd
 import numpy as np
-import random
 from pandas import DataFrame as df
-from matplotlib import pyplot as plt
-from matplotlib.patches import Polygon
-from shapely.geometry import Polygon, LineString, Point
+from instrumentation import logger, timed
+from lazy_imports import lazy_import
+
+# matplotlib and shapely are only imported when a plot or polygon geometry is first needed
+plt = lazy_import("matplotlib.pyplot")
+shapely = lazy_import("shapely")
+shapely_geometry = lazy_import("shapely.geometry")
+
+def _contains_xy():
+    """shapely 2 has vectorised predicates, older versions fall back to the ray casting kernel"""
+    return getattr(shapely, 'contains_xy', None)
 
 # constants
 H_ORDERS = 49 # number of harmonics in orders 2-50
 H_ORDERS_RANGE = list(range(2,51))
 R_HEADERS = [(f"R{str(i)}") for i in H_ORDERS_RANGE]
 X_HEADERS = [(f"X{str(i)}") for i in H_ORDERS_RANGE]
+SAMPLE_OVERSAMPLING = 1.2 # margin on the expected candidates needed per rejection sampling batch
+MAX_CANDIDATES = 2**20 # largest rejection sampling batch, 16 MB of R, X candidates
+POLYGON_CACHE_VERSION = 3 # bump when the parsing or layout of the compiled polygon cache changes
+
+def _file_hash(filename):
+    """sha256 of a file's contents, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def polygon_cache_filename(input_filename, input_sheet):
+    """Default location of the compiled polygon cache, next to the spreadsheet"""
+    return f"{os.path.splitext(input_filename)[0]}.{input_sheet}.npz"
+
+@timed("ingest_excel", count=lambda result: len(result[2]))
+def read_network_workbook(input_filename, input_sheet, header=0):
+    """Function reads an NSP network polygon spreadsheet (see Project.input_network_data
+    for the layout) into ragged vertex arrays. Empty cells are dropped per harmonic order so
+    polygons with fewer corner points than others keep all of their points.
+
+    Returns:
+        tuple: (orders, offsets, vertices) where the R, X corner points of orders[i] are
+            vertices[offsets[i]:offsets[i+1]]
+    """
+    data = pd.read_excel(input_filename, sheet_name=input_sheet, index_col=0, header=header)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Read {input_filename} [{input_sheet}]:\n{data.head()}")
+    data.reset_index(drop=True,inplace=True)
+    # TODO: need to account for fundamental if given 
+    assert len(data.columns)%H_ORDERS == 0, f"There are {len(data.columns)} columns!"
+    # only blank cells are missing corner points, anything else that isn't a number is a typo
+    data = data.replace(r'^\s*$', np.nan, regex=True)
+    numeric = data.apply(pd.to_numeric, errors='coerce')
+    malformed = numeric.isna() & data.notna()
+    assert not malformed.any().any(), (
+        f"{input_filename} [{input_sheet}] has non-numeric corner points: "
+        + ", ".join(f"data row {i+1} column {c} = {data.at[i, c]!r}" for i, c in malformed.stack().loc[lambda m: m].index[:10])
+    )
+    values = numeric.to_numpy(dtype=float)
+
+    orders = np.array(H_ORDERS_RANGE, dtype=np.int64)
+    points = []
+    for i in range(H_ORDERS):
+        pair = values[:, 2*i:2*i+2]
+        half_blank = np.isnan(pair).sum(axis=1) == 1
+        if half_blank.any():
+            logger.warning(f"{input_filename} [{input_sheet}] h={orders[i]}: dropping {half_blank.sum()} corner point(s) with only one of R and X")
+        points.append(pair[~np.isnan(pair).any(axis=1)])
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in points])]).astype(np.int64)
+    return orders, offsets, np.concatenate(points)
+
+def _write_network_cache(cache_filename, source_hash, input_sheet, header, orders, offsets, vertices):
+    """Writes the ragged vertex arrays to the .npz cache. The header is stored as JSON so
+    the cache never needs pickle to load, whatever was passed to pandas."""
+    # writing to a temporary file of this process first so a crashed or concurrent run never leaves a half written cache
+    tmp_filename = f"{cache_filename}.tmp{os.getpid()}.npz"
+    try:
+        np.savez(
+            tmp_filename, orders=orders, offsets=offsets, vertices=vertices,
+            source_hash=np.array(source_hash), sheet=np.array(str(input_sheet)), 
+            header=np.array(json.dumps(header)), version=np.array(POLYGON_CACHE_VERSION)
+        )
+        os.replace(tmp_filename, cache_filename)
+    except OSError:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+def compile_network_data(input_filename, input_sheet, header=0, cache_filename=None):
+    """Function converts a network polygon spreadsheet once into a compact .npz cache of
+    ragged vertex arrays keyed by harmonic order, stamped with the hash of the source file.
+    The vertices are stored as given in the spreadsheet, before any change of base.
+
+    Returns:
+        str: filename of the cache
+    """
+    cache_filename = cache_filename or polygon_cache_filename(input_filename, input_sheet)
+    source_hash = _file_hash(input_filename)
+    orders, offsets, vertices = read_network_workbook(input_filename, input_sheet, header=header)
+    _write_network_cache(cache_filename, source_hash, input_sheet, header, orders, offsets, vertices)
+    return cache_filename
+
+def load_network_data(input_filename, input_sheet, header=0, cache_filename=None, use_cache=True):
+    """Function loads the ragged network polygon arrays from the compiled cache, 
+    rebuilding the cache first if it is missing or the spreadsheet has changed since.
+    If the cache can't be written (e.g. a read-only folder) the spreadsheet is read directly.
+
+    Returns:
+        tuple: (orders, offsets, vertices), see read_network_workbook
+    """
+    if not use_cache:
+        return read_network_workbook(input_filename, input_sheet, header=header)
+    cache_filename = cache_filename or polygon_cache_filename(input_filename, input_sheet)
+    source_hash = _file_hash(input_filename)
+    if os.path.exists(cache_filename):
+        with np.load(cache_filename) as cache:
+            if (int(cache['version']) == POLYGON_CACHE_VERSION
+                    and str(cache['source_hash']) == source_hash
+                    and str(cache['sheet']) == str(input_sheet) and str(cache['header']) == json.dumps(header)):
+                return cache['orders'], cache['offsets'], cache['vertices']
+    orders, offsets, vertices = read_network_workbook(input_filename, input_sheet, header=header)
+    try:
+        _write_network_cache(cache_filename, source_hash, input_sheet, header, orders, offsets, vertices)
+    except OSError as error:
+        logger.warning(f"Could not write the polygon cache {cache_filename}, reading {input_filename} without it: {error}")
+    return orders, offsets, vertices
+
+def _points_in_polygon(vertices, px, py):
+    """Vectorised even-odd ray casting test of many points against one polygon.
+    Works for convex and non-convex polygons and loops only over the polygon edges.
+
+    Args:
+        vertices (numpy.ndarray): (n, 2) polygon corner points in R, X
+        px (numpy.ndarray): R values of the points to test
+        py (numpy.ndarray): X values of the points to test
+
+    Returns:
+        numpy.ndarray: boolean mask of the points inside the polygon
+    """
+    px = np.asarray(px, dtype=float)
+    py = np.asarray(py, dtype=float)
+    inside = np.zeros(np.broadcast(px, py).shape, dtype=bool)
+    x0, y0 = vertices[:, 0], vertices[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    for i in range(len(vertices)):
+        if y0[i] == y1[i]:
+            continue
+        crosses = (y0[i] > py) != (y1[i] > py)
+        x_cross = x0[i] + (py - y0[i]) * (x1[i] - x0[i]) / (y1[i] - y0[i])
+        inside ^= crosses & (px < x_cross)
+    return inside
+
+def _polygon_area(vertices):
+    """Shoelace area of a polygon given as an (n, 2) array, signed positive when anticlockwise"""
+    x, y = vertices[:, 0], vertices[:, 1]
+    return 0.5*float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def _triangulate_polygon(vertices):
+    """Ear clipping triangulation of a simple (convex or non-convex) polygon.
+
+    Returns:
+        numpy.ndarray: (n-2, 3, 2) array of triangle corner points
+    """
+    vertices = vertices if _polygon_area(vertices) > 0 else vertices[::-1]
+    remaining = list(range(len(vertices)))
+    triangles = []
+    while len(remaining) > 3:
+        n = len(remaining)
+        for i in range(n):
+            a, b, c = (vertices[remaining[(i + k) % n]] for k in (-1, 0, 1))
+            # the corner has to be convex and no other vertex can sit inside the ear
+            if (b[0]-a[0])*(c[1]-a[1]) - (b[1]-a[1])*(c[0]-a[0]) <= 0:
+                continue
+            others = vertices[[j for j in remaining if j not in (remaining[(i-1) % n], remaining[i], remaining[(i+1) % n])]]
+            if others.size and _points_in_polygon(np.array([a, b, c]), others[:, 0], others[:, 1]).any():
+                continue
+            triangles.append([a, b, c])
+            del remaining[i]
+            break
+        else:
+            # degenerate (e.g. collinear or self-intersecting) polygons: clip the next corner regardless
+            triangles.append([vertices[remaining[-1]], vertices[remaining[0]], vertices[remaining[1]]])
+            del remaining[0]
+    triangles.append(vertices[remaining].tolist())
+    return np.array(triangles, dtype=float)
+
+def _rejection_sample(candidates, inside, num_points, acceptance, accepted_points=None):
+    """Shared rejection sampling loop: draws batches of candidate points and keeps the ones
+    inside until at least num_points have been accepted. Each batch is sized from the expected
+    acceptance rate but capped at MAX_CANDIDATES, so skinny polygons with a low acceptance take
+    more batches rather than one huge one.
+
+    Args:
+        candidates (callable): candidates(n) returns at least n candidate points as an (m, 2) array
+        inside (callable): inside(points) returns the boolean mask of the points to keep
+        num_points (int): number of points to accept
+        acceptance (float): expected fraction of the candidates that are accepted
+        accepted_points (numpy.ndarray, optional): (k, 2) points already accepted. Defaults to None.
+
+    Returns:
+        numpy.ndarray: (m, 2) array of the accepted points, m >= num_points
+    """
+    batches = [] if accepted_points is None else [accepted_points]
+    accepted = sum(len(batch) for batch in batches)
+    while accepted < num_points:
+        batch = min(int(SAMPLE_OVERSAMPLING*(num_points - accepted)/acceptance) + 16, MAX_CANDIDATES)
+        points = candidates(batch)
+        batches.append(points[inside(points)])
+        accepted += len(batches[-1])
+    return np.concatenate(batches) if batches else np.empty((0, 2))
+
+@timed("sampling", count=len)
+def sample_points_in_polygon(vertices, num_points, rng=None, method="rejection", polygon=None):
+    """Function generates uniformly distributed random points inside a polygon in bulk.
+
+    Args:
+        vertices (numpy.ndarray): (n, 2) polygon corner points in R, X
+        num_points (int): number of points to generate
+        rng (numpy.random.Generator or int, optional): generator or seed for reproducible runs.
+            Defaults to None.
+        method (str, optional): "rejection" oversamples the bounding box in arrays and keeps the 
+            points that pass a vectorised point in polygon test. "triangulation" picks triangles of
+            the polygon weighted by area and samples each exactly.
+            "sobol", "halton" and "stratified" reject low-discrepancy or stratified points instead
+            of random ones, see qmc_sampling.PolygonSampler. Defaults to "rejection".
+        polygon (shapely.Polygon, optional): already built (and prepared) polygon of the
+            vertices to reuse for the rejection test. Defaults to None.
+
+    Returns:
+        numpy.ndarray: (num_points, 2) array of R, X points
+    """
+    rng = np.random.default_rng(rng)
+    if method == "triangulation":
+        triangles = _triangulate_polygon(vertices)
+        a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        areas = 0.5*np.abs((b[:, 0]-a[:, 0])*(c[:, 1]-a[:, 1]) - (b[:, 1]-a[:, 1])*(c[:, 0]-a[:, 0]))
+        picks = rng.choice(len(triangles), size=num_points, p=areas/areas.sum())
+        u, v = rng.random((2, num_points))
+        # folding the unit square onto the triangle keeps the density uniform
+        flip = u + v > 1
+        u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+        return a[picks] + u[:, None]*(b[picks]-a[picks]) + v[:, None]*(c[picks]-a[picks])
+    if method in ("sobol", "halton", "stratified"):
+        from qmc_sampling import PolygonSampler
+        return PolygonSampler(vertices, method=method, rng=rng, polygon=polygon).sample(num_points)
+    assert method == "rejection", f"Unknown sampling method {method}!"
+
+    min_xy, max_xy = vertices.min(axis=0), vertices.max(axis=0)
+    box_area = float(np.prod(max_xy - min_xy))
+    acceptance = abs(_polygon_area(vertices))/box_area if box_area else 0.0
+    assert acceptance > 0, "The polygon has no area to sample points from!"
+    contains_xy = _contains_xy()
+    if contains_xy and polygon is None:
+        polygon = shapely_geometry.Polygon(vertices)
+    def candidates(n):
+        return rng.uniform(min_xy, max_xy, size=(n, 2))
+    def inside(points):
+        if contains_xy:
+            return contains_xy(polygon, points[:, 0], points[:, 1])
+        return _points_in_polygon(vertices, points[:, 0], points[:, 1])
+    return _rejection_sample(candidates, inside, num_points, acceptance)[:num_points]
+
+@timed("sampling_boundary", count=len)
+def interpolate_boundary_points(vertices, num_pts=100, include_vertices=False):
+    """Function places points evenly along the closed polygon boundary using the cumulative 
+    edge lengths, starting and finishing at the first corner point.
+
+    Args:
+        vertices (numpy.ndarray): (n, 2) polygon corner points in R, X
+        num_pts (int, optional): number of boundary divisions, giving num_pts+1 points. Defaults to 100.
+        include_vertices (bool, optional): also place a point on every corner so that none of 
+            the vertices are cut off. Defaults to False.
+
+    Returns:
+        numpy.ndarray: (m, 2) array of R, X points along the boundary
+    """
+    closed = np.vstack([vertices, vertices[:1]])
+    cum_length = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(closed, axis=0).T))])
+    distances = np.linspace(0.0, cum_length[-1], num_pts + 1)
+    if include_vertices:
+        distances = np.union1d(distances, cum_length)
+    return np.column_stack([
+        np.interp(distances, cum_length, closed[:, 0]),
+        np.interp(distances, cum_length, closed[:, 1]),
+    ])
+
+def _closest_point_on_boundary(vertices, point):
+    """Finds the closest point on the polygon boundary to a given point by projecting
+    the point onto every edge at once.
+
+    Returns:
+        tuple: (distance, R of the closest point, X of the closest point)
+    """
+    start = vertices
+    edge = np.roll(vertices, -1, axis=0) - start
+    edge_sq = np.einsum('ij,ij->i', edge, edge)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.einsum('ij,ij->i', point - start, edge) / edge_sq
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    closest = start + t[:, None]*edge
+    dist = np.hypot(*(closest - point).T)
+    i = np.argmin(dist)
+    return float(dist[i]), float(closest[i, 0]), float(closest[i, 1])
+
+@timed("worst_case")
+def worst_case_amplification(project, h=None, *, site_z):
+    """Function finds the exact maximum amplification factor of each network polygon
+    and where in the polygon it occurs, without scanning a grid of points.
+    AF = |Zs| / |Zs + Zn| is largest where Zn is closest to -Zs, so this is the nearest point
+    of the filled polygon to -Zs. If -Zs sits inside the polygon the AF is unbounded (resonance),
+    otherwise the nearest point lies on the boundary and is found in O(vertices) by projecting
+    onto each edge. The inside test is an even-odd ray cast, so non-convex polygons are handled too.
+
+    Args:
+        project (Project): project with the network polygons read in
+        h (int or list, optional): harmonic order(s). Defaults to None for all orders in the project.
+        site_z (complex, list or dict): required site impedance R + jX in Ohms, either one value
+            for all orders, one value per order in h, or a dict keyed by harmonic order
+
+    Returns:
+        DataFrame: 'AF', 'R' and 'X' of the worst case point indexed by harmonic order 'h',
+            NaN for orders without any corner points
+    """
+    orders = list(project.polygons) if h is None else list(np.atleast_1d(h))
+    if isinstance(site_z, dict):
+        site_z = [site_z[order] for order in orders]
+    site_z = np.broadcast_to(np.asarray(site_z, dtype=complex), (len(orders),))
+
+    results = []
+    for order, z in zip(orders, site_z):
+        vertices = project._polygon_vertices(order)
+        resonance = np.array([-z.real, -z.imag])
+        if not len(vertices):
+            af, r, x = np.nan, np.nan, np.nan
+        elif _points_in_polygon(vertices, resonance[0], resonance[1]):
+            af, r, x = np.inf, resonance[0], resonance[1]
+        else:
+            dist, r, x = _closest_point_on_boundary(vertices, resonance)
+            af = abs(z)/dist if dist else np.inf
+        results.append([int(order), af, r, x])
+    return df(results, columns=['h', 'AF', 'R', 'X']).set_index('h')
+
+class PolygonSet():
+    """Compact store of the network polygons of every harmonic order. All corner points sit in
+    one contiguous (n, 2) float64 array of R, X with the points of orders[i] at
+    vertices[offsets[i]:offsets[i+1]]. Bounds, areas, convexity and the prepared shapely
+    geometries are only worked out on first use and then kept."""
+    __slots__ = ('orders', 'offsets', 'vertices', '_index', '_bounds', '_areas', '_convex', '_geometries')
+
+    def __init__(self, orders, offsets, vertices) -> None:
+        self.orders = np.asarray(orders, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 2)
+        assert len(self.offsets) == len(self.orders) + 1, "There needs to be one more offset than orders!"
+        self._index = {int(h): i for i, h in enumerate(self.orders)}
+        self._bounds = None
+        self._areas = None
+        self._convex = None
+        self._geometries = {}
+
+    @classmethod
+    def from_dict(cls, polygon_data_dict):
+        """Builds the set from a dict of R{h}, X{h} DataFrames keyed by harmonic order"""
+        orders = list(polygon_data_dict.keys())
+        points = [polygon_data_dict[h][[f"R{h}", f"X{h}"]].dropna().to_numpy(dtype=float) for h in orders]
+        offsets = np.concatenate([[0], np.cumsum([len(p) for p in points])])
+        vertices = np.concatenate(points) if points else np.empty((0, 2))
+        return cls(orders, offsets, vertices)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, h):
+        return int(h) in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def polygon(self, h):
+        """(n, 2) view of the corner points of harmonic order h"""
+        i = self._index[int(h)]
+        return self.vertices[self.offsets[i]:self.offsets[i+1]]
+
+    def frame(self, h):
+        """R{h}, X{h} DataFrame of the corner points of harmonic order h"""
+        vertices = self.polygon(h)
+        return df({f"R{h}": vertices[:, 0], f"X{h}": vertices[:, 1]})
+
+    @property
+    def bounds(self):
+        """(n_orders, 4) array of min R, min X, max R, max X per order"""
+        if self._bounds is None:
+            # reduceat can't reduce empty segments, so orders without corner points are left as NaN
+            filled = np.diff(self.offsets) > 0
+            starts = self.offsets[:-1][filled]
+            self._bounds = np.full((len(self.orders), 4), np.nan)
+            if filled.any():
+                self._bounds[filled] = np.column_stack([
+                    np.minimum.reduceat(self.vertices, starts, axis=0),
+                    np.maximum.reduceat(self.vertices, starts, axis=0),
+                ])
+        return self._bounds
+
+    @property
+    def areas(self):
+        """Enclosed area per order in Ohm^2"""
+        if self._areas is None:
+            # orders without corner points have no area and are skipped by the reduceat
+            filled = np.diff(self.offsets) > 0
+            self._areas = np.zeros(len(self.orders))
+            if filled.any():
+                # index of the next corner point, wrapping around within each polygon
+                next_idx = np.arange(1, len(self.vertices) + 1)
+                next_idx[self.offsets[1:][filled] - 1] = self.offsets[:-1][filled]
+                R, X = self.vertices[:, 0], self.vertices[:, 1]
+                cross = R*X[next_idx] - R[next_idx]*X
+                self._areas[filled] = 0.5*np.abs(np.add.reduceat(cross, self.offsets[:-1][filled]))
+        return self._areas
+
+    @property
+    def convex(self):
+        """Boolean per order of whether the polygon is convex"""
+        if self._convex is None:
+            convex = []
+            for h in self._index:
+                vertices = self.polygon(h)
+                edges = np.roll(vertices, -1, axis=0) - vertices
+                turns = edges[:, 0]*np.roll(edges[:, 1], -1) - edges[:, 1]*np.roll(edges[:, 0], -1)
+                turns = turns[turns != 0]
+                convex.append(bool(np.all(turns > 0) or np.all(turns < 0)))
+            self._convex = np.array(convex, dtype=bool)
+        return self._convex
+
+    def geometry(self, h):
+        """Prepared shapely Polygon of harmonic order h"""
+        h = int(h)
+        if h not in self._geometries:
+            polygon = shapely_geometry.Polygon(self.polygon(h))
+            if hasattr(shapely, 'prepare'):
+                shapely.prepare(polygon)
+            self._geometries[h] = polygon
+        return self._geometries[h]
 
 class Project():
     def __init__(self, name=None) -> None:
         self.project_name = name
-        self.h_R = df([])
-        self.h_X = df([])
-        self.polygon_data_dict = {}
+        self.polygons = PolygonSet([], [0], np.empty((0, 2)))
+        self._polygon_data_dict = None
         self.interpolated_polygon_points = {}
         self.points_inside_polygon = {}
 
     # def test_function():
     #     pass
 
-    def input_network_data(self, input_filename, input_sheet, Zbase, header=0):
+    @property
+    def polygon_data_dict(self):
+        """R{h}, X{h} DataFrames of the polygon corner points keyed by harmonic order.
+        Built from self.polygons on first access and kept for backward compatibility.
+        The mapping is read-only, so set the whole dict to change the polygons, e.g.
+        project.polygon_data_dict = {**project.polygon_data_dict, h: frame}"""
+        if self._polygon_data_dict is None:
+            self._polygon_data_dict = {h: self.polygons.frame(h) for h in self.polygons}
+        return MappingProxyType(self._polygon_data_dict)
+
+    @polygon_data_dict.setter
+    def polygon_data_dict(self, polygon_data_dict):
+        self.polygons = PolygonSet.from_dict(polygon_data_dict)
+        self._polygon_data_dict = None
+
+    @property
+    def h_R(self):
+        return pd.concat([self.polygon_data_dict[h][f"R{h}"] for h in self.polygons], axis=1) if len(self.polygons) else df([])
+
+    @property
+    def h_X(self):
+        return pd.concat([self.polygon_data_dict[h][f"X{h}"] for h in self.polygons], axis=1) if len(self.polygons) else df([])
+
+    @property
+    def raw_data(self):
+        return pd.concat([self.polygon_data_dict[h] for h in self.polygons], axis=1) if len(self.polygons) else df([])
+
+    def _polygon_vertices(self, h):
+        """Returns the polygon corner points for harmonic order h as an (n, 2) array of R, X"""
+        return self.polygons.polygon(h)
+
+    @timed("ingest")
+    def input_network_data(self, input_filename, input_sheet, Zbase, header=0, use_cache=True, cache_filename=None):
         """Function reads data from an NSP spreadsheet with network polygon data in the
         following format and separates this out into individual R and X dataframes to be stored
         against harmonic order keys in the self.network_polygons dict.
@@ -49,63 +516,38 @@ class Project():
         Args:
             input_filename (str): filename of the input spreadsheet
             input_sheet (str): worksheet in the input excel file
-            base (float):  MVA base that the input network polygon data is provided in
+            Zbase (float): base impedance that the input network polygon data is provided in
+            header (int, optional): header row of the worksheet. Defaults to 0.
+            use_cache (bool, optional): load the polygons from a compiled .npz cache next to the
+                spreadsheet, which is rebuilt only when the spreadsheet changes. Defaults to True.
+            cache_filename (str, optional): location of the cache. Defaults to None for 
+                polygon_cache_filename.
         """
-        data = pd.read_excel(input_filename, sheet_name=input_sheet, index_col=0, header=header)
-        print(data.head())
-        data.reset_index(drop=True,inplace=True)
-        # print(len(data.columns)%H_ORDERS)
         # TODO: add robustness to processing input data
-        # TODO: need to account for fundamental if given 
-        assert len(data.columns)%H_ORDERS == 0, f"There are {len(data.columns)} columns!"
+        orders, offsets, vertices = load_network_data(
+            input_filename, input_sheet, header=header, cache_filename=cache_filename, use_cache=use_cache
+        )
 
         # changing the base
-        data = data.dropna()*Zbase if Zbase else data.dropna()
-
-        # splitting out the DataFrame into resistance and inductance
-        self.h_R = data.iloc[:,::2]
-        self.h_R.columns = R_HEADERS
-        self.h_X = data.iloc[:,1::2]
-        self.h_X.columns = X_HEADERS
-
-        # storing the raw converted X and R data
-        self.raw_data = data
-
-        # compiling this into the network polygon dictionary stored per harmonic order
-        for h in H_ORDERS_RANGE:
-            self.polygon_data_dict[h] = pd.concat(
-                [self.h_R[f"R{str(h)}"], self.h_X[f"X{str(h)}"]], 
-                axis=1
-                )
+        vertices = vertices*Zbase if Zbase else vertices
+
+        self.polygons = PolygonSet(orders, offsets, vertices)
+        self._polygon_data_dict = None
         return
 
-    def interpolate_polygon_points(self, h, num_pts=100, print_figure=False):
+    def interpolate_polygon_points(self, h, num_pts=100, print_figure=False, include_vertices=False):
         """Function interpolates the network polygon corner points
         to create more points along the polygon boundary."""
-        X = self.polygon_data_dict[h][f"X{h}"].to_list()
-        R = self.polygon_data_dict[h][f"R{h}"].to_list()
+        points = interpolate_boundary_points(self._polygon_vertices(h), num_pts=num_pts, include_vertices=include_vertices)
+        interpolated_R = points[:, 0]
+        interpolated_X = points[:, 1]
 
-        # Create a Polygon object from the vertices
-        polygon = Polygon(zip(R, X))
-
-        # Create a LineString object from the exterior of the polygon
-        line = LineString(polygon.exterior)
-
-        # Interpolate points along the edge of the polygon
-        num_points = num_pts  # You can adjust the number of interpolated points
-        interpolated_points = [line.interpolate(i / num_points, normalized=True) for i in range(num_points + 1)]
-
-        # Extract x and y coordinates from the interpolated points
-        interpolated_R = [point.x for point in interpolated_points]
-        interpolated_X = [point.y for point in interpolated_points]
-
-        interpolated_points = df([])
-        interpolated_points[f"R{h}"] = interpolated_R
-        interpolated_points[f"X{h}"] = interpolated_X
+        interpolated_points = df({f"R{h}": interpolated_R, f"X{h}": interpolated_X})
         self.interpolated_polygon_points[h] = interpolated_points
 
         if print_figure == True:
             # Plot the polygon and the interpolated points
+            R, X = self._polygon_vertices(h).T.tolist()
             fig, ax = plt.subplots()
             ax.plot(R + [R[0]], X + [X[0]], marker='o', label='Polygon Vertices', linestyle='-', color='blue')
             ax.plot(interpolated_R, interpolated_X, marker='.', label='Interpolated Points', linestyle='-', color='red')
@@ -116,34 +558,38 @@ class Project():
             fig.savefig(f"{num_pts}polygon_points_interpolated_h{h}.png")
         return interpolated_points
 
-    def generate_random_points_inside_polygon(self, h, num_points=1000, print_figure=False):
-        """Function to generate random points inside the polygon"""
-        X = self.polygon_data_dict[h][f"X{h}"].to_list()
-        R = self.polygon_data_dict[h][f"R{h}"].to_list()
+    def interpolate_all_polygon_points(self, num_pts=100, include_vertices=False, orders=None):
+        """Function interpolates the boundary points of every harmonic order polygon in one call.
 
-        # Create a Polygon object from the vertices
-        polygon = Polygon(zip(R, X))
-
-        points = []
-        min_x, min_y, max_x, max_y = polygon.bounds
+        Args:
+            num_pts (int, optional): number of boundary divisions per polygon. Defaults to 100.
+            include_vertices (bool, optional): keep every corner point. Defaults to False.
+            orders (list, optional): harmonic orders to interpolate. Defaults to None for all orders.
 
-        # generate points
-        while len(points) < num_points:
-            random_point = Point(random.uniform(min_x, max_x), random.uniform(min_y, max_y))
-            if random_point.within(polygon):
-                points.append(random_point)
+        Returns:
+            dict: DataFrame of interpolated points keyed by harmonic order
+        """
+        orders = list(self.polygons) if orders is None else orders
+        for h in orders:
+            points = interpolate_boundary_points(self._polygon_vertices(h), num_pts=num_pts, include_vertices=include_vertices)
+            self.interpolated_polygon_points[h] = df({f"R{h}": points[:, 0], f"X{h}": points[:, 1]})
+        return {h: self.interpolated_polygon_points[h] for h in orders}
 
-        # Extract x and y coordinates from the random points
-        random_R = [point.x for point in points]
-        random_X = [point.y for point in points]
+    def generate_random_points_inside_polygon(self, h, num_points=1000, print_figure=False, rng=None, method="rejection"):
+        """Function to generate random points inside the polygon.
+        See sample_points_in_polygon for the rng and method options."""
+        points = sample_points_in_polygon(
+            self._polygon_vertices(h), num_points, rng=rng, method=method, polygon=self.polygons.geometry(h)
+        )
+        random_R = points[:, 0]
+        random_X = points[:, 1]
 
-        random_points_inside_poly = df([])
-        random_points_inside_poly[f"R{h}"] = random_R
-        random_points_inside_poly[f"X{h}"] = random_X
+        random_points_inside_poly = df({f"R{h}": random_R, f"X{h}": random_X})
         self.points_inside_polygon[h] = random_points_inside_poly
 
         if print_figure == True: 
             # Plot the polygon, its vertices, and the random points
+            R, X = self._polygon_vertices(h).T.tolist()
             fig, ax = plt.subplots()
             ax.plot(R + [R[0]], X + [X[0]], marker='o', label='Polygon Vertices', linestyle='-', color='blue')
             ax.plot(random_R, random_X, marker='.', label='Random Points', linestyle='None', color='green')
@@ -0,0 +1,132 @@
+"""Script that sweeps many site impedance operating points (plant dispatch, inverters online,
+filter banks switched, transformer taps, or a time series of these) against the fixed network
+polygon of a harmonic order. The network points on the boundary and inside the polygon are
+sampled once and kept on the Project, then every operating point is broadcast against all of
+them in chunks of operating points so the AF block stays a bounded size.
+
+The operating points can be given as arrays or read from a CSV with one row per operating point:
+    time                R14     X14
+    2023-12-11 00:00    42.1    -344.2
+    2023-12-11 00:30    40.8    -351.9
+    ...
+
+Date Created: 18/10/2026"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+from background_harmonics import calc_amplification_points
+from instrumentation import timer
+from streaming_stats import PERCENTILES
+
+# constants
+CHUNK_ELEMENTS = 2**22 # AF values per block (operating points x network points), 32 MB in float64
+
+def network_points(project, h, num_points=1000, num_pts=100, rng=None, method="rejection"):
+    """Boundary and interior network points of a harmonic order polygon as an (n, 2) array
+    of R, X. Points already interpolated / sampled on the project are reused, otherwise they
+    are generated once and stored on the project for the next sweep."""
+    if h not in project.interpolated_polygon_points:
+        project.interpolate_polygon_points(h, num_pts=num_pts)
+    if h not in project.points_inside_polygon:
+        project.generate_random_points_inside_polygon(h, num_points=num_points, rng=rng, method=method)
+    points = pd.concat([project.interpolated_polygon_points[h], project.points_inside_polygon[h]], axis=0)
+    return points[[f"R{h}", f"X{h}"]].to_numpy(dtype=np.float64)
+
+def sweep_operating_points(site_r_h, site_x_h, R, X, percentiles=PERCENTILES, chunk_elements=CHUNK_ELEMENTS):
+    """Function evaluates the AF of every operating point against every network point and
+    reduces it to the maximum (and where it occurs) and percentiles per operating point.
+
+    Args:
+        site_r_h (array-like): site resistance in Ohms (R), one per operating point
+        site_x_h (array-like): site inductance / capacitance in Ohms (X), one per operating point
+        R (array-like): network resistance points in Ohms
+        X (array-like): network inductance / capacitance points in Ohms
+        percentiles (list, optional): percentiles to report. Defaults to PERCENTILES.
+        chunk_elements (int, optional): AF values calculated per block. Defaults to CHUNK_ELEMENTS.
+
+    Returns:
+        DataFrame: 'max_AF', 'max_R', 'max_X' and 'p{q}_AF' columns, one row per operating point
+    """
+    site_r_h = np.atleast_1d(np.asarray(site_r_h, dtype=np.float64))
+    site_x_h = np.atleast_1d(np.asarray(site_x_h, dtype=np.float64))
+    assert site_r_h.shape == site_x_h.shape, f"Got {len(site_r_h)} site R values and {len(site_x_h)} site X values!"
+    R = np.asarray(R, dtype=np.float64).ravel()
+    X = np.asarray(X, dtype=np.float64).ravel()
+    assert len(R) > 0, "No network points to sweep the operating points against!"
+
+    n_ops = len(site_r_h)
+    max_af, max_r, max_x = np.empty(n_ops), np.empty(n_ops), np.empty(n_ops)
+    pct = np.empty((len(percentiles), n_ops))
+    chunk = max(1, chunk_elements // len(R))
+    with timer("operating_point_sweep", points=n_ops*len(R)):
+        for start in range(0, n_ops, chunk):
+            rows = slice(start, start+chunk)
+            af = calc_amplification_points(site_x_h[rows, None], site_r_h[rows, None], R[None, :], X[None, :])
+            worst = np.argmax(af, axis=1)
+            max_af[rows] = af[np.arange(len(worst)), worst]
+            max_r[rows], max_x[rows] = R[worst], X[worst]
+            if len(percentiles):
+                pct[:, rows] = np.percentile(af, percentiles, axis=1)
+
+    results = df({'max_AF': max_af, 'max_R': max_r, 'max_X': max_x})
+    for q, values in zip(percentiles, pct):
+        results[f"p{q:g}_AF"] = values
+    return results
+
+def operating_point_amplification(project, h, site_r_h, site_x_h, num_points=1000, num_pts=100,
+                                  rng=None, method="rejection", percentiles=PERCENTILES):
+    """Function sweeps an array of site impedance operating points against the network polygon
+    of harmonic order h, reusing the network points sampled on the project.
+    The maximum is over the sampled points, see worst_case_amplification for the exact bound.
+
+    Args:
+        project (Project): project with the network polygons read in
+        h (int): harmonic order
+        site_r_h (array-like): site resistance in Ohms (R), one per operating point
+        site_x_h (array-like): site inductance / capacitance in Ohms (X), one per operating point
+        num_points (int, optional): random points inside the polygon if not sampled yet. Defaults to 1000.
+        num_pts (int, optional): boundary divisions of the polygon if not interpolated yet. Defaults to 100.
+        rng (numpy.random.Generator or int, optional): generator or seed. Defaults to None.
+        method (str, optional): sampling method, see sample_points_in_polygon. Defaults to "rejection".
+        percentiles (list, optional): percentiles to report. Defaults to PERCENTILES.
+
+    Returns:
+        DataFrame: 'site_r_h', 'site_x_h', 'max_AF', 'max_R', 'max_X' and 'p{q}_AF' per operating point
+    """
+    points = network_points(project, h, num_points=num_points, num_pts=num_pts, rng=rng, method=method)
+    results = sweep_operating_points(site_r_h, site_x_h, points[:, 0], points[:, 1], percentiles=percentiles)
+    results.insert(0, 'site_r_h', np.atleast_1d(site_r_h).astype(np.float64))
+    results.insert(1, 'site_x_h', np.atleast_1d(site_x_h).astype(np.float64))
+    return results
+
+def operating_point_amplification_csv(project, h, input_filename, r_column=None, x_column=None,
+                                      output_filename=None, **kwargs):
+    """Function reads the operating points from a CSV, sweeps them against the network polygon
+    of harmonic order h and returns the input rows with the AF results appended.
+
+    Args:
+        project (Project): project with the network polygons read in
+        h (int): harmonic order
+        input_filename (str): CSV with one row per operating point
+        r_column (str, optional): column of site R. Defaults to None for f"R{h}".
+        x_column (str, optional): column of site X. Defaults to None for f"X{h}".
+        output_filename (str, optional): CSV to write the results to. Defaults to None.
+        **kwargs: passed on to operating_point_amplification
+
+    Returns:
+        DataFrame: operating points with 'max_AF', 'max_R', 'max_X' and 'p{q}_AF' columns
+    """
+    r_column = r_column or f"R{h}"
+    x_column = x_column or f"X{h}"
+    operating_points = pd.read_csv(input_filename)
+    for column in (r_column, x_column):
+        assert column in operating_points.columns, f"{input_filename} has no '{column}' column!"
+
+    results = operating_point_amplification(
+        project, h, operating_points[r_column].to_numpy(), operating_points[x_column].to_numpy(), **kwargs
+    )
+    results = pd.concat([operating_points, results.drop(columns=['site_r_h', 'site_x_h'])], axis=1)
+    if output_filename:
+        results.to_csv(output_filename, index=False)
+    return results
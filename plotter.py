@@ -4,10 +4,56 @@ the calculations in background_harmonics.py. Main script can call this.
 Author: Inez Zheng (@zeniconcombres)
 Date Created: 16 Jan 2024"""
 
-import plotly.graph_objects as go
-from matplotlib.colors import LinearSegmentedColormap
-from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
+import os
+import json
+import numpy as np
+from background_harmonics import calc_sensitivities
+from instrumentation import timed
+from lazy_imports import lazy_import
+
+# plotly and matplotlib are only imported when the first plot is made
+go = lazy_import("plotly.graph_objects")
+plotly_subplots = lazy_import("plotly.subplots")
+plt = lazy_import("matplotlib.pyplot")
+mcollections = lazy_import("matplotlib.collections")
+
+# constants
+MAX_PIXELS = (800, 800) # default (R, X) resolution plotted when downsampling the AF grid
+
+def downsample_grid(R_range, X_range, ampfac, max_pixels=MAX_PIXELS):
+    """Function decimates the AF grid down to at most max_pixels cells by splitting it into 
+    blocks and keeping, for each block, whichever of its min or max is furthest from the
+    mean of the whole grid. This keeps the resonance peaks and the troughs that plain 
+    striding would skip.
+
+    Args:
+        R_range (numpy.ndarray): R axis of the grid
+        X_range (numpy.ndarray): X axis of the grid
+        ampfac (numpy.ndarray): (len(X_range), len(R_range)) AF grid
+        max_pixels (tuple, optional): maximum (R, X) cells to keep. Defaults to MAX_PIXELS.
+
+    Returns:
+        tuple: decimated R_range, X_range and ampfac
+    """
+    ampfac = np.asarray(ampfac)
+    R_range, X_range = np.asarray(R_range, dtype=float), np.asarray(X_range, dtype=float)
+    block_x = max(1, -(-ampfac.shape[0] // max_pixels[1]))
+    block_r = max(1, -(-ampfac.shape[1] // max_pixels[0]))
+    if block_x == 1 and block_r == 1:
+        return R_range, X_range, ampfac
+    # padding with the edge values so the grid splits into whole blocks without new extremes
+    pad_x = -ampfac.shape[0] % block_x
+    pad_r = -ampfac.shape[1] % block_r
+    blocks = np.pad(ampfac, ((0, pad_x), (0, pad_r)), mode='edge')
+    blocks = blocks.reshape(blocks.shape[0]//block_x, block_x, blocks.shape[1]//block_r, block_r)
+    finite = ampfac[np.isfinite(ampfac)]
+    grid_mean = finite.mean() if finite.size else 0.0
+    block_min = blocks.min(axis=(1, 3))
+    block_max = blocks.max(axis=(1, 3))
+    decimated = np.where(block_max - grid_mean >= grid_mean - block_min, block_max, block_min)
+    R_blocks = np.pad(R_range, (0, pad_r), mode='edge').reshape(-1, block_r).mean(axis=1)
+    X_blocks = np.pad(X_range, (0, pad_x), mode='edge').reshape(-1, block_x).mean(axis=1)
+    return R_blocks, X_blocks, decimated
 
 def _gen_heatmap(R_range, X_range, ampfac):
     """Create a 2D heatmap with color scale representing the absolute value of Z"""
@@ -34,17 +80,20 @@ def _gen_site_impedance(site_r_h, site_x_h):
     )
     return site_impedance
 
-def _gen_sensitivities(R_range, X_range, ampfac, r_h, x_h):
+def _gen_sensitivities(R_range, X_range, ampfac, r_h, x_h, site_r_h=None, site_x_h=None):
     """Line graph of amplification values for a given network point 
     to show the particular sensitivities around this point"""
+    af_over_r, af_over_x = calc_sensitivities(
+        R_range, X_range, r_h, x_h, ampfac=ampfac, site_r_h=site_r_h, site_x_h=site_x_h
+    )
     line_graph_x = go.Scatter(
         x=X_range,
-        y=ampfac[:,[i[0] for i in enumerate(R_range) if i[1]==r_h]].transpose()[0],
+        y=af_over_x[0],
         mode='lines', name='Amplification change over X'
     )
     line_graph_r = go.Scatter(
         x=R_range,
-        y=ampfac[[i[0] for i in enumerate(X_range) if i[1]==x_h]][0],
+        y=af_over_r[0],
         mode='lines', name='Amplification change over R'
     )
     return line_graph_r, line_graph_x
@@ -65,10 +114,11 @@ def _gen_polygon_points(polygon,h):
     )
     return poly_scatter, poly_line
 
+@timed("plotting")
 def plot_soln_space(
         R_range, X_range, ampfac, site_r_h, site_x_h,
         plotter_r=0.0, plotter_x=100.0, h=2, polygon=None,
-        filename=None
+        filename=None, max_pixels=None, include_plotlyjs=True
     ):
     """This function plots out the amplification factor results. The plot generates
     an html output which has interactive toggles. The graphs can also be
@@ -84,25 +134,29 @@ def plot_soln_space(
         site_x_h (float, optional): site aggregate inductance / capacitance in Ohms (X)
         plotter_r (float, optional): impedance point's resistance value
             to appear in the focus plots to show sensitivity. Defaults to 0.0.
-        plotter_x (float, optional): impedance point's resistance value 
-            to appear in the focus plots to show sensitivity. Defaults to 100.0.
-        # TODO: takee seensitivity point as a float not just integer
+        plotter_x (float, optional): impedance point's reactance value 
+            to appear in the focus plots to show sensitivity. Any float inside the grid
+            is interpolated between the grid lines. Defaults to 100.0.
         h (int, optional): harmonic order the graphs represent. Defaults to 2.
         filename (str, optional): for example, '2023-10-10_plots.png'. Defaults to None.
+        max_pixels (tuple, optional): (R, X) resolution the heatmap and contours are
+            downsampled to, see downsample_grid. Defaults to None for the full grid.
+        include_plotlyjs (bool or str, optional): True inlines plotly.js in the html, 'cdn' 
+            references it online and 'directory' or a path to a .js file shares one copy 
+            between files. Defaults to True.
     """
     # Define a custom colormap from green to red
     # TODO: originally wanted to create a customised colour scale but the front end
     # is a bit fiddly to adjust the scales in the colourmap hence deleting for now
 
     # generate plot objects for each subplot
-    heatmap, contours = _gen_heatmap(R_range, X_range, ampfac)
+    if max_pixels:
+        heatmap, contours = _gen_heatmap(*downsample_grid(R_range, X_range, ampfac, max_pixels=max_pixels))
+    else:
+        heatmap, contours = _gen_heatmap(R_range, X_range, ampfac)
     site_impedance = _gen_site_impedance(site_r_h, site_x_h)
     # print(ampfac) TODO!!!
-    try:
-        line_graph_r, line_graph_x = _gen_sensitivities(R_range, X_range, ampfac, r_h=plotter_r, x_h=plotter_x)
-    except:
-        print("Given sensitivity point failed to find a trace in the AF dataframe. Trying a default R=0.0 and X = 100.0.")
-        line_graph_r, line_graph_x = _gen_sensitivities(R_range, X_range, ampfac, r_h=0.0, x_h=100.0)
+    line_graph_r, line_graph_x = _gen_sensitivities(R_range, X_range, ampfac, r_h=plotter_r, x_h=plotter_x)
 
     # Create the layout
     layout = go.Layout(
@@ -111,7 +165,7 @@ def plot_soln_space(
     )
 
     # Create subplots with one row and two columns
-    fig = make_subplots(
+    fig = plotly_subplots.make_subplots(
         rows=1, cols=3, subplot_titles=[
         'Amplification change over X', 
         'Amplification change over R', 
@@ -155,11 +209,180 @@ def plot_soln_space(
     fig.update_layout(layout)
 
     # Save the interactive plot to a HTML file
-    fig.write_html("interactive_"+filename+".html") if filename else None
+    fig.write_html("interactive_"+filename+".html", include_plotlyjs=include_plotlyjs) if filename else None
 
     plt.close()
     return
 
+@timed("plotting")
+def plot_soln_space_png(
+        R_range, X_range, ampfac, site_r_h, site_x_h, h=2, polygon=None,
+        filename=None, max_pixels=MAX_PIXELS
+    ):
+    """Static alternative to plot_soln_space that draws the AF heatmap with matplotlib
+    imshow and saves it as a .png, without building any plotly traces.
+
+    Args:
+        R_range (numpy.ndarray): R axis of the grid
+        X_range (numpy.ndarray): X axis of the grid
+        ampfac (numpy.ndarray): (len(X_range), len(R_range)) AF grid
+        site_r_h (float): site aggregate resistance in Ohms (R)
+        site_x_h (float): site aggregate inductance / capacitance in Ohms (X)
+        h (int, optional): harmonic order the graph represents. Defaults to 2.
+        polygon (DataFrame, optional): network polygon corner points R{h}, X{h}. Defaults to None.
+        filename (str, optional): saved as filename+'.png'. Defaults to None.
+        max_pixels (tuple, optional): (R, X) resolution to downsample to. Defaults to MAX_PIXELS.
+
+    Returns:
+        fig, ax: figure and axis from pyplot
+    """
+    R_range, X_range, ampfac = downsample_grid(R_range, X_range, ampfac, max_pixels=max_pixels)
+    fig, ax = plt.subplots(1,1)
+    image = ax.imshow(
+        ampfac, origin='lower', aspect='auto', cmap='viridis', interpolation='nearest',
+        extent=[R_range[0], R_range[-1], X_range[0], X_range[-1]]
+    )
+    fig.colorbar(image, ax=ax, label='Amplification Factor (AF)')
+    ax.plot(site_r_h, site_x_h, marker='x', color='white', linestyle='none', label='Site Impedance')
+    if polygon is not None and not polygon.empty:
+        R, X = polygon[f"R{h}"].to_list(), polygon[f"X{h}"].to_list()
+        ax.plot(R + [R[0]], X + [X[0]], marker='o', markersize=3, color='orange', label='Network polygon')
+    ax.set_xlabel('R (Ohms)')
+    ax.set_ylabel('X (Ohms)')
+    ax.set_title(f'Plot of Amplification Factor for h={h}')
+    fig.savefig(filename+'.png') if filename else None
+    return fig, ax
+
+@timed("plotting")
+def plot_adaptive_cells(cells, site_r_h, site_x_h, h=2, polygon=None, filename=None):
+    """Function draws the AF of the adaptively refined cells from adaptive_soln_space as
+    coloured squares, so the fine cells around the resonance show at their own resolution.
+
+    Args:
+        cells (DataFrame): leaf cells with R, X, size and AF columns
+        site_r_h (float): site aggregate resistance in Ohms (R)
+        site_x_h (float): site aggregate inductance / capacitance in Ohms (X)
+        h (int, optional): harmonic order the graph represents. Defaults to 2.
+        polygon (DataFrame, optional): network polygon corner points R{h}, X{h}. Defaults to None.
+        filename (str, optional): saved as filename+'.png'. Defaults to None.
+
+    Returns:
+        fig, ax: figure and axis from pyplot
+    """
+    centres = cells[['R', 'X']].to_numpy()
+    half = cells['size'].to_numpy()[:, None, None]/2
+    corners = centres[:, None, :] + half*np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]])[None, :, :]
+    squares = mcollections.PolyCollection(corners, array=cells['AF'].to_numpy(), cmap='viridis', edgecolors='none')
+    fig, ax = plt.subplots(1,1)
+    ax.add_collection(squares)
+    ax.autoscale_view()
+    fig.colorbar(squares, ax=ax, label='Amplification Factor (AF)')
+    ax.plot(site_r_h, site_x_h, marker='x', color='white', linestyle='none', label='Site Impedance')
+    if polygon is not None and not polygon.empty:
+        R, X = polygon[f"R{h}"].to_list(), polygon[f"X{h}"].to_list()
+        ax.plot(R + [R[0]], X + [X[0]], marker='o', markersize=3, color='orange', label='Network polygon')
+    ax.set_xlabel('R (Ohms)')
+    ax.set_ylabel('X (Ohms)')
+    ax.set_title(f'Adaptive Amplification Factor for h={h} ({len(cells)} cells)')
+    fig.savefig(filename+'.png') if filename else None
+    return fig, ax
+
+_REPORT_SCRIPT = """
+(function() {
+var select = document.getElementById('af_order');
+var plot = document.getElementById('af_report');
+var loaded = {};
+function showOrder(h) {
+    var data = loaded[h];
+    Plotly.restyle(plot, {z: [data.z, data.z], x: [data.R, data.R], y: [data.X, data.X]}, [0, 1]);
+    Plotly.restyle(plot, {x: [[data.site[0]], data.polygon[0]], y: [[data.site[1]], data.polygon[1]]}, [2, 3]);
+    Plotly.relayout(plot, {title: 'Plot of Amplification Factor for h=' + h});
+}
+// called by each order's data script once it has loaded
+window.afReportData = function(h, data) {
+    loaded[h] = data;
+    if (String(h) === select.value) { showOrder(h); }
+};
+select.addEventListener('change', function() {
+    var h = select.value;
+    if (loaded[h]) { showOrder(h); return; }
+    // script tags rather than fetch so the report also works when opened straight from disk
+    var script = document.createElement('script');
+    script.src = select.dataset.folder + '/h' + h + '.js';
+    document.body.appendChild(script);
+});
+})();
+"""
+
+@timed("plotting")
+def plot_soln_space_report(
+        R_range, X_range, ampfac, orders, site_r_h, site_x_h, polygons=None,
+        filename='amplification_report', max_pixels=(400, 400), include_plotlyjs='cdn'
+    ):
+    """Function writes the AF heatmaps of many harmonic orders into one html report with a
+    drop down to switch between them. Only the first order is in the html itself. The
+    downsampled grid of every order is written to a small script in the folder
+    filename+'_data' next to the report and only loaded when the order is selected, so the
+    page stays small and opens quickly however many orders there are. Keep the folder with
+    the html when moving or sharing the report.
+
+    Args:
+        R_range (numpy.ndarray): R axis of the grid
+        X_range (numpy.ndarray): X axis of the grid
+        ampfac (numpy.ndarray): (len(orders), len(X_range), len(R_range)) AF cube,
+            e.g. from calc_amplification_batch
+        orders (list): harmonic order of each AF grid in the cube
+        site_r_h (array-like): site resistance in Ohms (R) per order
+        site_x_h (array-like): site inductance / capacitance in Ohms (X) per order
+        polygons (PolygonSet, optional): network polygons, e.g. Project.polygons. Defaults to None.
+        filename (str, optional): saved as filename+'.html'. Defaults to 'amplification_report'.
+        max_pixels (tuple, optional): (R, X) resolution per order. Defaults to (400, 400).
+        include_plotlyjs (bool or str, optional): see plot_soln_space. Defaults to 'cdn'.
+    """
+    site_r_h = np.broadcast_to(site_r_h, (len(orders),))
+    site_x_h = np.broadcast_to(site_x_h, (len(orders),))
+    data_folder = filename + '_data'
+    os.makedirs(data_folder, exist_ok=True)
+    first = None
+    for i, h in enumerate(orders):
+        R_plot, X_plot, af_plot = downsample_grid(R_range, X_range, ampfac[i], max_pixels=max_pixels)
+        polygon = [[], []]
+        if polygons is not None and h in polygons:
+            vertices = np.vstack([polygons.polygon(h), polygons.polygon(h)[:1]])
+            polygon = [vertices[:, 0].round(3).tolist(), vertices[:, 1].round(3).tolist()]
+        data = {
+            'R': R_plot.round(3).tolist(), 'X': X_plot.round(3).tolist(),
+            # json has no infinity, so resonance cells are left as gaps
+            'z': np.where(np.isfinite(af_plot), af_plot, np.nan).round(4).tolist(),
+            'site': [float(site_r_h[i]), float(site_x_h[i])], 'polygon': polygon,
+        }
+        # the first order is also written out so that it can be switched back to
+        with open(os.path.join(data_folder, f'h{h}.js'), 'w') as f:
+            f.write(f'afReportData({int(h)}, {json.dumps(data).replace("NaN", "null")});')
+        first = data if first is None else first
+
+    heatmap, contours = _gen_heatmap(first['R'], first['X'], first['z'])
+    fig = go.Figure([
+        heatmap, contours, _gen_site_impedance(*first['site']),
+        go.Scatter(x=first['polygon'][0], y=first['polygon'][1], mode='lines+markers', name='Network polygon'),
+    ])
+    fig.update_layout(title=f'Plot of Amplification Factor for h={orders[0]}', showlegend=False)
+    fig.update_xaxes(title_text='R (Ohms)')
+    fig.update_yaxes(title_text='X (Ohms)')
+
+    options = "".join(f'<option value="{h}">h={h}</option>' for h in orders)
+    plot_div = fig.to_html(
+        include_plotlyjs=include_plotlyjs, full_html=False, div_id='af_report', post_script=_REPORT_SCRIPT
+    )
+    with open(filename+'.html', 'w') as f:
+        f.write(
+            '<html><head><meta charset="utf-8" /></head><body>'
+            '<label for="af_order">Harmonic order </label>'
+            f'<select id="af_order" data-folder="{os.path.basename(data_folder)}">{options}</select>'
+            f'{plot_div}</body></html>'
+        )
+    return
+
 def plot_network_polygon(plot_data, h):
     """Function that plots the network polygons when taking in a dataframe for the polygon
     corner points. Example input:
@@ -0,0 +1,156 @@
+"""Script that contains the low-discrepancy and stratified sampling of network polygons, and
+a sampling loop that stops as soon as the AF percentile (or maximum) estimate has converged.
+
+Points are drawn from a scrambled Sobol' or Halton sequence (scipy.stats.qmc), from a
+stratified grid over the bounding box of the polygon, or plain uniformly at random, and the
+ones outside the polygon are rejected. Low-discrepancy points cover the polygon much more
+evenly than random ones, so the percentiles settle with far fewer AF evaluations.
+
+The confidence interval comes from independent replicates: several samplers with different
+scrambles / seeds are run side by side in batches, and the spread of their estimates gives a
+Student t interval. Sampling stops once the interval is within the tolerance.
+
+Date Created: 18/10/2026"""
+
+import numpy as np
+from background_harmonics import calc_amplification_points
+from network_polygons import (
+    shapely_geometry, _contains_xy, _points_in_polygon, _polygon_area, _rejection_sample
+)
+from instrumentation import timed
+from lazy_imports import lazy_import
+
+# scipy is only needed for the Sobol' / Halton sequences and the confidence interval
+qmc = lazy_import("scipy.stats.qmc")
+scipy_stats = lazy_import("scipy.stats")
+
+# constants
+SAMPLING_METHODS = ("sobol", "halton", "stratified", "random")
+SOBOL_MIN_BLOCK = 256 # Sobol' points are drawn in power of 2 blocks to keep their balance properties
+BATCH_POINTS = 256 # points per replicate added each round
+REPLICATES = 8 # independent samplers used for the confidence interval
+MIN_BATCHES = 2 # rounds before the stopping rule is checked
+MAX_POINTS = 200000 # sampling budget over all of the replicates
+CONFIDENCE = 0.95 # confidence level of the reported interval
+
+class PolygonSampler():
+    """Stream of points inside a polygon from one sampling method. Successive calls to sample
+    carry on along the same sequence, so batches together keep the low discrepancy.
+
+    Args:
+        vertices (numpy.ndarray): (n, 2) polygon corner points in R, X
+        method (str, optional): "sobol", "halton", "stratified" or "random". Defaults to "sobol".
+        rng (numpy.random.Generator or int, optional): generator or seed for the scrambling,
+            jitter or random points. Defaults to None.
+        polygon (shapely.Polygon, optional): already built (and prepared) polygon of the
+            vertices to reuse for the rejection test. Defaults to None.
+    """
+    __slots__ = ('vertices', 'method', 'min_xy', 'span', 'acceptance', '_polygon', '_contains_xy', '_rng', '_engine', '_buffer')
+
+    def __init__(self, vertices, method="sobol", rng=None, polygon=None) -> None:
+        assert method in SAMPLING_METHODS, f"Unknown sampling method {method}, use one of {SAMPLING_METHODS}!"
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.method = method
+        self.min_xy = self.vertices.min(axis=0)
+        self.span = self.vertices.max(axis=0) - self.min_xy
+        box_area = float(np.prod(self.span))
+        self.acceptance = abs(_polygon_area(self.vertices))/box_area if box_area else 0.0
+        assert self.acceptance > 0, "The polygon has no area to sample points from!"
+        self._contains_xy = _contains_xy()
+        if self._contains_xy and polygon is None:
+            polygon = shapely_geometry.Polygon(self.vertices)
+        self._polygon = polygon
+        self._rng = np.random.default_rng(rng)
+        self._engine = None
+        if method == "sobol":
+            self._engine = qmc.Sobol(d=2, scramble=True, seed=self._rng)
+        elif method == "halton":
+            self._engine = qmc.Halton(d=2, scramble=True, seed=self._rng)
+        self._buffer = np.empty((0, 2))
+
+    def _unit_candidates(self, n):
+        """At least n candidate points in the unit square"""
+        if self.method == "sobol":
+            return self._engine.random(2**int(np.ceil(np.log2(max(n, SOBOL_MIN_BLOCK)))))
+        if self.method == "halton":
+            return self._engine.random(n)
+        if self.method == "stratified":
+            # one jittered point in each cell of a k x k grid, shuffled so a partly used batch is still uniform
+            k = int(np.ceil(np.sqrt(n)))
+            cells = np.indices((k, k)).reshape(2, -1).T
+            return self._rng.permutation((cells + self._rng.random(cells.shape))/k)
+        return self._rng.random((n, 2))
+
+    def _inside(self, points):
+        if self._contains_xy:
+            return self._contains_xy(self._polygon, points[:, 0], points[:, 1])
+        return _points_in_polygon(self.vertices, points[:, 0], points[:, 1])
+
+    def sample(self, num_points):
+        """Next num_points points inside the polygon as a (num_points, 2) array of R, X"""
+        def candidates(n):
+            return self.min_xy + self._unit_candidates(n)*self.span
+        points = _rejection_sample(candidates, self._inside, num_points, self.acceptance, accepted_points=self._buffer)
+        self._buffer = points[num_points:]
+        return points[:num_points]
+
+@timed("converged_sampling")
+def converged_polygon_amplification(project, h, site_x_h, site_r_h, q=0.95, tol=0.01, method="sobol",
+                                    batch_points=BATCH_POINTS, replicates=REPLICATES, confidence=CONFIDENCE,
+                                    max_points=MAX_POINTS, rng=None):
+    """Function estimates a percentile (or the maximum) of the AF over the inside of a network
+    polygon, sampling in batches until the estimate has converged within tol.
+
+    After every round each of the replicate samplers adds batch_points points. The estimate is
+    the percentile of all of the points together and the confidence interval is the Student t
+    interval of the replicate estimates. Sampling stops once its half width is within
+    tol*estimate, or when max_points have been used. For the maximum (q=1) the exact value
+    from worst_case_amplification is usually the better choice.
+
+    Args:
+        project (Project): project with the network polygons read in
+        h (int): harmonic order
+        site_x_h (float): site inductance / capacitance in Ohms (X)
+        site_r_h (float): site resistance in Ohms (R)
+        q (float, optional): quantile to estimate between 0 and 1, 1 for the maximum. Defaults to 0.95.
+        tol (float, optional): relative half width of the confidence interval to stop at. Defaults to 0.01.
+        method (str, optional): "sobol", "halton", "stratified" or "random". Defaults to "sobol".
+        batch_points (int, optional): points per replicate per round. Defaults to BATCH_POINTS.
+        replicates (int, optional): independent samplers, at least 2. Defaults to REPLICATES.
+        confidence (float, optional): confidence level of the interval. Defaults to CONFIDENCE.
+        max_points (int, optional): sampling budget over all of the replicates. Defaults to MAX_POINTS.
+        rng (numpy.random.Generator or int, optional): generator or seed. Defaults to None.
+
+    Returns:
+        dict: 'estimate', 'ci_low', 'ci_high', 'half_width', 'confidence', 'q', 'n_points',
+            'n_batches', 'converged' and 'method'
+    """
+    assert 0 < q <= 1, f"The quantile has to be between 0 and 1, got {q}!"
+    assert replicates >= 2, "At least 2 replicates are needed for a confidence interval!"
+    rng = np.random.default_rng(rng)
+    vertices = project._polygon_vertices(h)
+    polygon = project.polygons.geometry(h)
+    samplers = [PolygonSampler(vertices, method=method, rng=seed, polygon=polygon)
+                for seed in rng.integers(0, 2**63, size=replicates)]
+    t_value = scipy_stats.t.ppf(0.5 + confidence/2, replicates - 1)
+
+    af = [np.empty(0) for _ in samplers]
+    n_batches, converged = 0, False
+    while True:
+        for i, sampler in enumerate(samplers):
+            points = sampler.sample(batch_points)
+            af[i] = np.concatenate([af[i], calc_amplification_points(site_x_h, site_r_h, points[:, 0], points[:, 1])])
+        n_batches += 1
+        n_points = n_batches*batch_points*replicates
+        estimate = float(np.quantile(np.concatenate(af), q))
+        with np.errstate(invalid='ignore'):
+            half_width = float(t_value*np.std([np.quantile(a, q) for a in af], ddof=1)/np.sqrt(replicates))
+        converged = n_batches >= MIN_BATCHES and half_width <= tol*abs(estimate)
+        if converged or n_points + batch_points*replicates > max_points:
+            break
+
+    return {
+        'estimate': estimate, 'ci_low': estimate - half_width, 'ci_high': estimate + half_width,
+        'half_width': half_width, 'confidence': confidence, 'q': q, 'n_points': n_points,
+        'n_batches': n_batches, 'converged': bool(converged), 'method': method,
+    }
@@ -0,0 +1,222 @@
+"""Script that contains a precomputed lookup of the amplification factor for interactive
+what-if queries. AF = |Zs| / |Zs + Zn| only depends on the offset w = Zn - (-Zs) of the network
+impedance from the resonance point -Zs, so a single map of 1/|w| over a normalised offset
+plane answers every site impedance and harmonic order by shifting the lookup by -Zs:
+
+    AF(Zs, Zn) = |Zs| * G(Zn + Zs),   G(w) = 1/|w|
+
+The map is built once, saved as a .npy file (with its settings in a .json file next to it)
+and loaded back as a read-only memory map, so only the pages a query touches are read.
+Queries are bilinearly interpolated between the map points. The interpolation error of 1/|w|
+grows as |w|^-3 towards the singularity, so points closer to -Zs than exact_radius, and points
+off the map, fall back to the exact calculation. This keeps the relative error below rel_tol.
+
+Example:
+    resonance = load_or_build_resonance_map("resonance_map.npy")
+    AF = resonance.query_grid(site_x_h=-344.2, site_r_h=42.1, R_range=R_range, X_range=X_range)
+
+Date Created: 18/10/2026"""
+
+import os
+import json
+import numpy as np
+from background_harmonics import calc_amplification_points
+from instrumentation import timed
+
+# constants
+MAP_SPACING = 1.0 # Ohms between map points
+MAP_EXTENT = 2000.0 # the map covers offsets of -MAP_EXTENT to MAP_EXTENT Ohms in R and X
+REL_TOL = 1e-3 # relative error bound of the interpolated AF
+MAP_CHUNK_ROWS = 256 # map rows calculated per block when building
+RESONANCE_MAP_VERSION = 1 # bump when the layout of the saved map changes
+
+def _exact_radius_cells(rel_tol):
+    """Smallest distance from the singularity, in map spacings, at which bilinear interpolation
+    of 1/|w| is within rel_tol. The interpolation error over a cell of size d is at most
+    d^2/8 * (|G_uu| + |G_vv|) <= 3 d^2 / (8 r_min^3), and every point of the cell around a query
+    at distance r is at least r - sqrt(2) d from the singularity, so relative to G = 1/r the
+    error is below 3 k / (8 (k - sqrt(2))^3) for r = k d. That decreases with k, so bisect it."""
+    assert rel_tol > 0, "The relative tolerance must be positive!"
+    def bound(k):
+        return 3*k/(8*(k - np.sqrt(2))**3)
+    lo, hi = np.sqrt(2), 2.0
+    while bound(hi) > rel_tol:
+        lo, hi = hi, 2*hi
+    for _ in range(60):
+        mid = 0.5*(lo + hi)
+        lo, hi = (mid, hi) if bound(mid) > rel_tol else (lo, mid)
+    return hi
+
+def _settings_filename(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+class ResonanceMap():
+    """Normalised 1/|w| map for shifted AF lookups.
+
+    Args:
+        table (numpy.ndarray): (2n+1, 2n+1) map of 1/|w| with X offsets down the rows and
+            R offsets along the columns, centred on w = 0
+        spacing (float): Ohms between map points
+        rel_tol (float, optional): relative error bound of the interpolated AF. Defaults to REL_TOL.
+        filename (str, optional): file the map was saved to. Defaults to None.
+    """
+    __slots__ = ('table', 'spacing', 'n', 'rel_tol', 'exact_radius', 'filename')
+
+    def __init__(self, table, spacing, rel_tol=REL_TOL, filename=None) -> None:
+        assert table.ndim == 2 and table.shape[0] == table.shape[1] and table.shape[0] % 2 == 1, \
+            f"The resonance map must be square with an odd number of points, got {table.shape}!"
+        self.table = table
+        self.spacing = float(spacing)
+        self.n = table.shape[0] // 2
+        self.rel_tol = float(rel_tol)
+        self.exact_radius = _exact_radius_cells(rel_tol)*self.spacing
+        self.filename = filename
+
+    @property
+    def extent(self):
+        """Largest R or X offset from the resonance point covered by the map in Ohms"""
+        return self.n*self.spacing
+
+    @classmethod
+    @timed("resonance_map_build")
+    def build(cls, spacing=MAP_SPACING, extent=MAP_EXTENT, rel_tol=REL_TOL, filename=None, chunk_rows=MAP_CHUNK_ROWS):
+        """Calculates the map, straight into a memory-mapped .npy file if filename is given.
+        The map is float32: its rounding (~1e-7 relative) is far below rel_tol."""
+        assert spacing > 0 and extent > spacing, "The map extent must cover at least one map spacing!"
+        n = int(round(extent/spacing))
+        offsets = np.arange(-n, n+1)*spacing
+        shape = (len(offsets), len(offsets))
+        if filename:
+            table = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=shape)
+        else:
+            table = np.empty(shape, dtype=np.float32)
+        with np.errstate(divide='ignore'):
+            for start in range(0, shape[0], chunk_rows):
+                table[start:start+chunk_rows] = 1.0/np.hypot(offsets[None, :], offsets[start:start+chunk_rows, None])
+        if filename:
+            table.flush()
+            with open(_settings_filename(filename), 'w') as f:
+                json.dump({'version': RESONANCE_MAP_VERSION, 'spacing': float(spacing), 'n': n, 'rel_tol': float(rel_tol)}, f)
+            table = np.load(filename, mmap_mode='r')
+        return cls(table, spacing, rel_tol=rel_tol, filename=filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a saved map as a read-only memory map"""
+        with open(_settings_filename(filename)) as f:
+            settings = json.load(f)
+        assert settings.get('version') == RESONANCE_MAP_VERSION, f"{filename} was saved by a different version!"
+        return cls(np.load(filename, mmap_mode='r'), settings['spacing'], rel_tol=settings['rel_tol'], filename=filename)
+
+    def _interpolate(self, u, v):
+        """Bilinear interpolation of the map at fractional map indices u (R) and v (X)"""
+        i = np.clip(np.floor(u).astype(np.intp), 0, 2*self.n - 1)
+        j = np.clip(np.floor(v).astype(np.intp), 0, 2*self.n - 1)
+        t, s = u - i, v - j
+        table = self.table
+        return ((1 - s)*((1 - t)*table[j, i] + t*table[j, i+1])
+                + s*((1 - t)*table[j+1, i] + t*table[j+1, i+1]))
+
+    @timed("resonance_map_query", count=np.size)
+    def query(self, site_x_h, site_r_h, R, X):
+        """Function looks up the amplification factor at arbitrary network impedance points,
+        broadcasting the site and network impedances against each other like
+        calc_amplification_points. Points within exact_radius of the resonance point or off
+        the map are calculated exactly.
+
+        Args:
+            site_x_h (float or array-like): site inductance / capacitance in Ohms (X)
+            site_r_h (float or array-like): site resistance in Ohms (R)
+            R (array-like): network resistance points in Ohms
+            X (array-like): network inductance / capacitance points in Ohms
+
+        Returns:
+            numpy.ndarray: AF with the broadcast shape of the inputs
+        """
+        site_x_h, site_r_h, R, X = np.broadcast_arrays(
+            *(np.asarray(a, dtype=np.float64) for a in (site_x_h, site_r_h, R, X))
+        )
+        w_r, w_x = R + site_r_h, X + site_x_h
+        u, v = w_r/self.spacing + self.n, w_x/self.spacing + self.n
+        exact = (np.hypot(w_r, w_x) < self.exact_radius) | ~((u >= 0) & (u <= 2*self.n) & (v >= 0) & (v <= 2*self.n))
+
+        af = np.empty(w_r.shape)
+        lookup = ~exact
+        af[lookup] = np.hypot(site_r_h[lookup], site_x_h[lookup])*self._interpolate(u[lookup], v[lookup])
+        if exact.any():
+            af[exact] = calc_amplification_points(site_x_h[exact], site_r_h[exact], R[exact], X[exact])
+        return af
+
+    @timed("resonance_map_query_grid", count=np.size)
+    def query_grid(self, site_x_h, site_r_h, R_range, X_range):
+        """Function looks up the AF grid over a solution space, the same grid as
+        calc_amplification on gen_soln_space. When the grid step is a whole number of map
+        spacings the shifted map points are strided views of the map, so the lookup is four
+        slices and a weighted sum with the same weights everywhere. Other grids go through query.
+
+        Args:
+            site_x_h (float): site inductance / capacitance in Ohms (X)
+            site_r_h (float): site resistance in Ohms (R)
+            R_range (numpy.ndarray): evenly spaced numbers across the network R range
+            X_range (numpy.ndarray): evenly spaced numbers across the network X range
+
+        Returns:
+            numpy.ndarray: AF grid of shape (len(X_range), len(R_range))
+        """
+        R_range = np.asarray(R_range, dtype=np.float64)
+        X_range = np.asarray(X_range, dtype=np.float64)
+        strides = [self._grid_stride(R_range), self._grid_stride(X_range)]
+        if None in strides:
+            return self.query(site_x_h, site_r_h, R_range[None, :], X_range[:, None])
+
+        # the offsets of every grid point share the same fractional map index
+        u0 = (R_range[0] + site_r_h)/self.spacing + self.n
+        v0 = (X_range[0] + site_x_h)/self.spacing + self.n
+        i0, j0 = int(np.floor(u0)), int(np.floor(v0))
+        t, s = u0 - i0, v0 - j0
+        i1 = i0 + strides[0]*(len(R_range) - 1) + 1
+        j1 = j0 + strides[1]*(len(X_range) - 1) + 1
+        if i0 < 0 or j0 < 0 or i1 > 2*self.n or j1 > 2*self.n:
+            return self.query(site_x_h, site_r_h, R_range[None, :], X_range[:, None])
+
+        def shifted(di, dj):
+            return self.table[j0+dj:j1+dj:strides[1], i0+di:i1+di:strides[0]]
+
+        # a zero weight on the singularity gives NaN there, which the exact block below replaces
+        with np.errstate(invalid='ignore'):
+            af = (1 - s)*(1 - t)*shifted(0, 0).astype(np.float64)
+            af += (1 - s)*t*shifted(1, 0)
+            af += s*(1 - t)*shifted(0, 1)
+            af += s*t*shifted(1, 1)
+        af *= np.hypot(site_r_h, site_x_h)
+
+        # exact values in the block of grid points around the resonance point
+        cols = np.flatnonzero(np.abs(R_range + site_r_h) < self.exact_radius)
+        rows = np.flatnonzero(np.abs(X_range + site_x_h) < self.exact_radius)
+        if len(cols) and len(rows):
+            block = np.s_[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1]
+            af[block] = calc_amplification_points(
+                site_x_h, site_r_h, R_range[None, block[1]], X_range[block[0], None]
+            )
+        return af
+
+    def _grid_stride(self, axis_range):
+        """Map points per grid step of an evenly spaced range, or None if it is not a whole number"""
+        if len(axis_range) < 2:
+            return 1
+        steps = np.diff(axis_range)/self.spacing
+        stride = int(round(steps[0]))
+        if stride < 1 or not np.allclose(steps, stride, rtol=0, atol=1e-9*max(1, stride)):
+            return None
+        return stride
+
+def load_or_build_resonance_map(filename, spacing=MAP_SPACING, extent=MAP_EXTENT, rel_tol=REL_TOL):
+    """Loads the map saved in filename, building (and saving) it first if it doesn't exist
+    or was built with different settings"""
+    if os.path.exists(filename) and os.path.exists(_settings_filename(filename)):
+        with open(_settings_filename(filename)) as f:
+            settings = json.load(f)
+        if settings == {'version': RESONANCE_MAP_VERSION, 'spacing': float(spacing),
+                        'n': int(round(extent/spacing)), 'rel_tol': float(rel_tol)}:
+            return ResonanceMap.load(filename)
+    return ResonanceMap.build(spacing=spacing, extent=extent, rel_tol=rel_tol, filename=filename)
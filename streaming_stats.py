@@ -0,0 +1,163 @@
+"""Script that contains a streaming statistics accumulator for amplification factors, so that
+percentiles can be worked out from millions of sampled network points without ever holding
+all of them in memory. The percentiles come from a merging t-digest sketch, which keeps a small
+set of weighted centroids that are finest at the tails where the 95th/99th percentiles sit.
+Accumulators from different worker processes can be merged together.
+
+Date Created: 18/10/2026"""
+
+import numpy as np
+from pandas import DataFrame as df
+from background_harmonics import calc_amplification_points
+from network_polygons import sample_points_in_polygon, interpolate_boundary_points
+
+# constants
+PERCENTILES = [50, 95, 99] # percentiles reported by default
+COMPRESSION = 200 # t-digest compression, roughly twice the number of centroids kept
+BUFFER_SIZE = 50000 # values buffered before they are merged into the centroids
+BATCH_SIZE = 100000 # sampled network points per batch in the streaming pipeline
+
+class StreamingStats():
+    """Running count, mean, min and max of the amplification factors plus a t-digest
+    sketch for the percentiles. Non-finite AF (exactly at resonance) are counted and
+    treated as the largest values; NaN values are ignored."""
+
+    def __init__(self, percentiles=PERCENTILES, compression=COMPRESSION, buffer_size=BUFFER_SIZE) -> None:
+        self.percentiles = list(percentiles)
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.n_inf = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._finite_max = -np.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        """Adds a chunk of AF values to the accumulator"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return self
+        finite = values[np.isfinite(values)]
+        self.count += values.size
+        self.n_inf += values.size - finite.size
+        self.max = max(self.max, float(values.max()))
+        if finite.size:
+            self.total += float(finite.sum())
+            self.min = min(self.min, float(finite.min()))
+            self._finite_max = max(self._finite_max, float(finite.max()))
+            self._buffer.append(finite)
+            self._buffered += finite.size
+            if self._buffered >= self.buffer_size:
+                self._compress()
+        return self
+
+    def merge(self, other):
+        """Merges the accumulator from another process into this one"""
+        self.count += other.count
+        self.n_inf += other.n_inf
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._finite_max = max(self._finite_max, other._finite_max)
+        other._compress()
+        self._compress(other._means, other._weights)
+        return self
+
+    def _compress(self, means=None, weights=None):
+        """Folds the buffered values (and any extra centroids) into the centroids. Sorted
+        points are grouped by the integer part of the k1 scale function at their cumulative
+        weight, so the centroids are small near the tails and large around the median."""
+        parts_means = [self._means] + self._buffer + ([means] if means is not None else [])
+        parts_weights = [self._weights] + [np.ones(len(b)) for b in self._buffer] + ([weights] if weights is not None else [])
+        self._buffer, self._buffered = [], 0
+        all_means = np.concatenate(parts_means)
+        if not all_means.size:
+            return
+        all_weights = np.concatenate(parts_weights)
+        order = np.argsort(all_means, kind='stable')
+        all_means, all_weights = all_means[order], all_weights[order]
+
+        cum_weight = np.cumsum(all_weights)
+        q_left = (cum_weight - all_weights)/cum_weight[-1]
+        k = self.compression/(2*np.pi)*np.arcsin(2*q_left - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate([[True], np.diff(bucket) != 0]))
+        self._weights = np.add.reduceat(all_weights, starts)
+        self._means = np.add.reduceat(all_means*all_weights, starts)/self._weights
+
+    @property
+    def mean(self):
+        if self.n_inf:
+            return np.inf
+        return self.total/self.count if self.count else np.nan
+
+    def quantile(self, q):
+        """AF at quantile q (0-1), interpolated between the centroids"""
+        if not self.count:
+            return np.nan
+        self._compress()
+        rank = q*self.count
+        n_finite = self.count - self.n_inf
+        if rank > n_finite or not n_finite:
+            return np.inf
+        # each centroid sits at the middle of its cumulative weight, pinned to the min and max
+        centres = np.cumsum(self._weights) - self._weights/2
+        return float(np.interp(
+            rank, np.concatenate([[0], centres, [n_finite]]),
+            np.concatenate([[self.min], self._means, [self._finite_max]])
+        ))
+
+    def summary(self):
+        """dict of count, mean, min, max and the configured percentiles as p<percentile>"""
+        summary = {'count': self.count, 'mean': self.mean, 'min': self.min, 'max': self.max}
+        for p in self.percentiles:
+            summary[f"p{p:g}"] = self.quantile(p/100.0)
+        return summary
+
+def stats_table(stats_by_order):
+    """Summary of StreamingStats keyed by harmonic order as a DataFrame indexed by 'h'"""
+    table = df.from_dict({h: stats.summary() for h, stats in stats_by_order.items()}, orient='index')
+    table.index.name = 'h'
+    return table
+
+def polygon_amplification_stats(project, h, site_x_h, site_r_h, num_points=1000, num_pts=100,
+                                batch_size=BATCH_SIZE, rng=None, method="rejection",
+                                percentiles=PERCENTILES, stats=None):
+    """Function streams points sampled inside (and along the boundary of) a network polygon
+    straight through the AF calculation into a StreamingStats accumulator, one batch at a time.
+
+    Args:
+        project (Project): project with the network polygons read in
+        h (int): harmonic order
+        site_x_h (float): site inductance / capacitance in Ohms (X)
+        site_r_h (float): site resistance in Ohms (R)
+        num_points (int, optional): random points inside the polygon. Defaults to 1000.
+        num_pts (int, optional): boundary divisions of the polygon. Defaults to 100.
+        batch_size (int, optional): points sampled per batch. Defaults to BATCH_SIZE.
+        rng (numpy.random.Generator or int, optional): generator or seed. Defaults to None.
+        method (str, optional): sampling method, see sample_points_in_polygon. Defaults to "rejection".
+        percentiles (list, optional): percentiles to report. Defaults to PERCENTILES.
+        stats (StreamingStats, optional): accumulator to add to. Defaults to None for a new one.
+
+    Returns:
+        StreamingStats: accumulator holding the AF of every point
+    """
+    stats = stats if stats is not None else StreamingStats(percentiles=percentiles)
+    rng = np.random.default_rng(rng)
+    polygon = project._polygon_vertices(h)
+    geometry = project.polygons.geometry(h)
+
+    boundary = interpolate_boundary_points(polygon, num_pts=num_pts)
+    stats.update(calc_amplification_points(site_x_h, site_r_h, boundary[:, 0], boundary[:, 1]))
+    for start in range(0, num_points, batch_size):
+        points = sample_points_in_polygon(
+            polygon, min(batch_size, num_points - start), rng=rng, method=method, polygon=geometry
+        )
+        stats.update(calc_amplification_points(site_x_h, site_r_h, points[:, 0], points[:, 1]))
+    return stats
@@ -0,0 +1,35 @@
+"""Tests of the on-disk AF cache size limit and cache keys."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from af_cache import ResultCache, cached_soln_space, cached_polygon_sweep
+from network_polygons import Project
+
+def _project():
+    project = Project()
+    project.polygon_data_dict = {5: pd.DataFrame({"R5": [10.0, 200.0, 200.0, 10.0], "X5": [-100.0, -100.0, 100.0, 100.0]})}
+    return project
+
+def test_result_larger_than_the_cache_is_returned(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    R_range, X_range, AF = cached_soln_space(-344.2, 42.1, step=50.0, cache=cache)
+    assert AF.shape == (len(X_range), len(R_range))
+
+def test_new_result_is_not_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=10000)
+    cached_soln_space(-344.2, 42.1, step=50.0, cache=cache)
+    R_range, X_range, AF = cached_soln_space(-300.0, 42.1, step=50.0, cache=cache)
+    assert AF.shape == (len(X_range), len(R_range))
+    assert cache.size() <= 10000
+
+def test_generator_seeds_are_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    project = _project()
+    first = cached_polygon_sweep(project, 5, -344.2, 42.1, seed=np.random.default_rng(1), cache=cache)
+    second = cached_polygon_sweep(project, 5, -344.2, 42.1, seed=np.random.default_rng(2), cache=cache)
+    assert (first['inside'] != second['inside']).any()
+    assert cache.size() == 0
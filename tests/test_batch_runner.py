@@ -0,0 +1,67 @@
+"""Tests of the batch runner grouping and checkpointing, run in process (workers=0) on
+synthetic polygon workbooks."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import pandas as pd
+import pytest
+import batch_runner
+from synthetic_data import write_synthetic_workbook
+
+ORDERS = [5, 6, 7]
+SETTINGS = dict(workers=0, chunk_orders=2, num_points=200, num_pts=20, seed=0)
+
+def _manifest(scenarios):
+    return pd.DataFrame([
+        {'site': 'S', 'scenario': scenario, 'polygon_file': polygon_file, 'polygon_sheet': 'polygon',
+         'Zbase': 1.0, 'header': 1, 'h': h, 'site_r_h': 20.0, 'site_x_h': -150.0}
+        for scenario, polygon_file in scenarios for h in ORDERS
+    ])
+
+def _max_af(results, scenario):
+    return results[results['scenario'] == scenario].sort_values('h')['max_AF'].to_numpy()
+
+@pytest.fixture
+def workbooks(tmp_path):
+    return (
+        write_synthetic_workbook(str(tmp_path / "a.xlsx"), rng=1),
+        write_synthetic_workbook(str(tmp_path / "b.xlsx"), rng=2),
+    )
+
+def test_scenarios_use_their_own_workbook(tmp_path, workbooks):
+    a, b = workbooks
+    both = batch_runner.run_batch(_manifest([('caseA', a), ('caseB', b)]), str(tmp_path / "both.csv"), **SETTINGS)
+    only_b = batch_runner.run_batch(_manifest([('caseB', b)]), str(tmp_path / "b.csv"), **SETTINGS)
+    assert (_max_af(both, 'caseB') == _max_af(only_b, 'caseB')).all()
+    assert not (_max_af(both, 'caseA') == _max_af(both, 'caseB')).all()
+
+def test_checkpoints_resume_and_invalidate(tmp_path, workbooks, monkeypatch):
+    a, _ = workbooks
+    output = str(tmp_path / "results.csv")
+    first = batch_runner.run_batch(_manifest([('caseA', a)]), output, **SETTINGS)
+
+    # every chunk is checkpointed, so a rerun doesn't evaluate anything
+    run_chunk = batch_runner._run_chunk
+    def fail(*args, **kwargs):
+        raise AssertionError("chunk was rerun")
+    monkeypatch.setattr(batch_runner, '_run_chunk', fail)
+    resumed = batch_runner.run_batch(_manifest([('caseA', a)]), output, **SETTINGS)
+    pd.testing.assert_frame_equal(first, resumed)
+
+    # a changed workbook is a new input, so its chunks are rerun rather than read from the checkpoints
+    monkeypatch.setattr(batch_runner, '_run_chunk', run_chunk)
+    write_synthetic_workbook(a, rng=3)
+    changed = batch_runner.run_batch(_manifest([('caseA', a)]), output, **SETTINGS)
+    fresh = batch_runner.run_batch(_manifest([('caseA', a)]), str(tmp_path / "fresh.csv"), **SETTINGS)
+    assert (_max_af(changed, 'caseA') == _max_af(fresh, 'caseA')).all()
+    assert not (_max_af(changed, 'caseA') == _max_af(first, 'caseA')).all()
+
+def test_parquet_without_an_engine_falls_back_to_csv(tmp_path, workbooks, monkeypatch):
+    a, _ = workbooks
+    monkeypatch.setattr(batch_runner, 'PARQUET_ENGINES', ('no_such_parquet_engine',))
+    results = batch_runner.run_batch(_manifest([('caseA', a)]), str(tmp_path / "results.parquet"), **SETTINGS)
+    assert not os.path.exists(tmp_path / "results.parquet")
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "results.csv"), results)
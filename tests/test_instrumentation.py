@@ -0,0 +1,36 @@
+"""Tests of the section timers and their peak memory tracking."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pytest
+import instrumentation
+
+@pytest.fixture
+def tracking():
+    instrumentation.reset()
+    instrumentation.enable(track_memory=True)
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+def test_nested_section_keeps_outer_peak(tracking):
+    with instrumentation.timer("outer"):
+        big = np.ones(10_000_000)
+        del big
+        with instrumentation.timer("inner"):
+            small = np.ones(1000)
+    metrics = instrumentation.metrics()
+    assert metrics["outer"]["peak_memory_bytes"] >= 80_000_000
+    assert metrics["inner"]["peak_memory_bytes"] < 1_000_000
+
+def test_outer_peak_includes_inner_peak(tracking):
+    with instrumentation.timer("outer"):
+        with instrumentation.timer("inner"):
+            big = np.ones(10_000_000)
+            del big
+    metrics = instrumentation.metrics()
+    assert metrics["inner"]["peak_memory_bytes"] >= 80_000_000
+    assert metrics["outer"]["peak_memory_bytes"] >= 80_000_000
@@ -0,0 +1,82 @@
+"""Tests of reading the network polygon workbook and the compact polygon store."""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import numpy as np
+import pandas as pd
+import pytest
+from network_polygons import PolygonSet, Project, load_network_data, read_network_workbook, sample_points_in_polygon
+from synthetic_data import write_synthetic_workbook
+
+def _edit_cell(filename, row, col, value):
+    data = pd.read_excel(filename, sheet_name="polygon", header=None)
+    data.iat[row, col] = value
+    data.to_excel(filename, sheet_name="polygon", index=False, header=False)
+
+def test_blank_cells_are_dropped(tmp_path):
+    filename = write_synthetic_workbook(str(tmp_path / "polygons.xlsx"))
+    _edit_cell(filename, 4, 1, None)
+    _edit_cell(filename, 4, 2, None)
+    orders, offsets, vertices = read_network_workbook(filename, "polygon", header=1)
+    assert offsets[1] - offsets[0] == 11
+    assert offsets[2] - offsets[1] == 12
+
+def test_malformed_cells_raise(tmp_path):
+    filename = write_synthetic_workbook(str(tmp_path / "polygons.xlsx"))
+    _edit_cell(filename, 4, 3, "12.3a")
+    with pytest.raises(AssertionError, match="12.3a"):
+        read_network_workbook(filename, "polygon", header=1)
+
+def test_cache_round_trip_without_header(tmp_path):
+    filename = write_synthetic_workbook(str(tmp_path / "polygons.xlsx"))
+    # the same corner points without the two header rows
+    data = pd.read_excel(filename, sheet_name="polygon", header=None).iloc[2:]
+    data.to_excel(filename, sheet_name="polygon", index=False, header=False)
+    cache_filename = str(tmp_path / "polygons.npz")
+    expected = read_network_workbook(filename, "polygon", header=None)
+    for _ in range(2):
+        loaded = load_network_data(filename, "polygon", header=None, cache_filename=cache_filename)
+        for array, expected_array in zip(loaded, expected):
+            assert np.array_equal(array, expected_array)
+    assert sorted(os.listdir(tmp_path)) == ["polygons.npz", "polygons.xlsx"]
+
+def test_unwritable_cache_falls_back_to_the_workbook(tmp_path):
+    filename = write_synthetic_workbook(str(tmp_path / "polygons.xlsx"))
+    cache_filename = str(tmp_path / "missing" / "polygons.npz")
+    orders, offsets, vertices = load_network_data(filename, "polygon", header=1, cache_filename=cache_filename)
+    assert np.array_equal(vertices, read_network_workbook(filename, "polygon", header=1)[2])
+    assert not os.path.exists(tmp_path / "missing")
+
+def test_bounds_and_areas_with_empty_orders():
+    square = np.array([[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0]])
+    triangle = np.array([[10.0, 0.0], [14.0, 0.0], [10.0, 3.0]])
+    # the empty orders sit first, in the middle and last
+    polygons = PolygonSet([2, 3, 4, 5, 6], [0, 0, 4, 4, 7, 7], np.vstack([square, triangle]))
+    assert np.allclose(polygons.areas, [0.0, 4.0, 0.0, 6.0, 0.0])
+    assert np.isnan(polygons.bounds[[0, 2, 4]]).all()
+    assert np.allclose(polygons.bounds[[1, 3]], [[0.0, 0.0, 2.0, 2.0], [10.0, 0.0, 14.0, 3.0]])
+
+def test_rejection_sampling_memory_is_bounded():
+    # a thin diagonal strip accepts about 1 in 1000 bounding box candidates
+    vertices = np.array([[0.0, 0.0], [1000.0, 1000.0], [1000.0, 1001.0], [0.0, 1.0]])
+    tracemalloc.start()
+    points = sample_points_in_polygon(vertices, 20000, rng=1)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert points.shape == (20000, 2)
+    assert ((points[:, 1] >= points[:, 0]) & (points[:, 1] <= points[:, 0] + 1)).all()
+    assert peak < 100*2**20
+
+def test_polygon_data_dict_is_read_only():
+    project = Project()
+    square = pd.DataFrame({"R5": [10.0, 200.0, 200.0, 10.0], "X5": [-100.0, -100.0, 100.0, 100.0]})
+    project.polygon_data_dict = {5: square}
+    with pytest.raises(TypeError):
+        project.polygon_data_dict[7] = square.rename(columns={"R5": "R7", "X5": "X7"})
+    project.polygon_data_dict = {**project.polygon_data_dict, 7: square.rename(columns={"R5": "R7", "X5": "X7"})}
+    assert list(project.polygons) == [5, 7]
+    assert np.array_equal(project._polygon_vertices(7), square.to_numpy())
@@ -0,0 +1,50 @@
+"""Tests of the resonance map lookups against the exact amplification factor."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pytest
+from background_harmonics import calc_amplification_points
+from resonance_map import ResonanceMap, load_or_build_resonance_map
+
+REL_TOL = 1e-3
+SITES = [(42.1, -144.2), (5.0, 60.3), (0.3, -12.75)] # site R, X
+
+@pytest.fixture(scope="module")
+def resonance():
+    return ResonanceMap.build(spacing=1.0, extent=200.0, rel_tol=REL_TOL)
+
+def _rel_err(af, exact):
+    return np.abs(af - exact)/exact
+
+@pytest.mark.parametrize("site_r_h, site_x_h", SITES)
+def test_query_is_within_tolerance(resonance, site_r_h, site_x_h):
+    rng = np.random.default_rng(1)
+    # on and off the map, and close to the resonance point on both sides of exact_radius
+    R = np.concatenate([rng.uniform(-400, 400, 20000), -site_r_h + rng.uniform(-1, 1, 2000)*3*resonance.exact_radius])
+    X = np.concatenate([rng.uniform(-400, 400, 20000), -site_x_h + rng.uniform(-1, 1, 2000)*3*resonance.exact_radius])
+    af = resonance.query(site_x_h, site_r_h, R, X)
+    exact = calc_amplification_points(site_x_h, site_r_h, R, X)
+    assert _rel_err(af, exact).max() <= REL_TOL
+
+@pytest.mark.parametrize("site_r_h, site_x_h", SITES)
+@pytest.mark.parametrize("step", [1.0, 2.0, 0.7])
+def test_query_grid_is_within_tolerance(resonance, site_r_h, site_x_h, step):
+    # the grid passes close to the resonance point, and the last one runs off the map
+    for start in (-120.25, -260.5):
+        R_range = start + 0.1 + np.arange(int(240/step))*step
+        X_range = start + np.arange(int(250/step))*step
+        af = resonance.query_grid(site_x_h, site_r_h, R_range, X_range)
+        exact = calc_amplification_points(site_x_h, site_r_h, R_range[None, :], X_range[:, None])
+        assert af.shape == exact.shape
+        assert _rel_err(af, exact).max() <= REL_TOL
+
+def test_saved_map_is_reused(tmp_path):
+    filename = str(tmp_path / "resonance_map.npy")
+    built = load_or_build_resonance_map(filename, spacing=1.0, extent=50.0, rel_tol=REL_TOL)
+    loaded = load_or_build_resonance_map(filename, spacing=1.0, extent=50.0, rel_tol=REL_TOL)
+    assert isinstance(loaded.table, np.memmap)
+    assert np.array_equal(built.table, loaded.table)
+    assert np.isclose(loaded.query(-20.0, 10.0, 3.0, 7.5), calc_amplification_points(-20.0, 10.0, 3.0, 7.5))
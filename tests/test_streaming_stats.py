@@ -0,0 +1,47 @@
+"""Tests of the streaming AF percentiles and merging against numpy on the full data."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pytest
+from streaming_stats import StreamingStats
+
+PERCENTILES = [1, 5, 50, 95, 99]
+
+@pytest.fixture(scope="module")
+def values():
+    # heavy tailed like the AF over a polygon
+    return np.random.default_rng(1).lognormal(0.0, 1.0, 400000)
+
+def _stats(chunks):
+    stats = StreamingStats(percentiles=PERCENTILES)
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats
+
+def _check_percentiles(stats, values):
+    summary = stats.summary()
+    assert summary['count'] == len(values)
+    assert np.isclose(summary['mean'], values.mean())
+    assert (summary['min'], summary['max']) == (values.min(), values.max())
+    for p in PERCENTILES:
+        estimate, exact = summary[f"p{p:g}"], np.percentile(values, p)
+        # close in value, and its rank in the data is close to p
+        assert abs(estimate/exact - 1) < 0.01
+        assert abs((values <= estimate).mean() - p/100) < 5e-4
+
+def test_percentiles_match_numpy(values):
+    _check_percentiles(_stats(np.array_split(values, 37)), values)
+
+def test_merge_matches_numpy(values):
+    first = _stats(np.array_split(values[:150000], 7))
+    second = _stats(np.array_split(values[150000:], 11))
+    _check_percentiles(first.merge(second), values)
+
+def test_resonance_values_are_the_largest(values):
+    stats = _stats([values[:9900], [np.inf]*100, [np.nan]*50])
+    assert stats.count == 10000 and stats.n_inf == 100
+    assert np.isinf(stats.quantile(0.995)) and np.isinf(stats.mean)
+    assert abs(stats.quantile(0.5)/np.percentile(values[:9900], 50*10000/9900) - 1) < 0.01
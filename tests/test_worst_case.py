@@ -0,0 +1,64 @@
+"""Tests of the exact worst case amplification against a dense brute force sample."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+import pytest
+from background_harmonics import calc_amplification_points
+from network_polygons import PolygonSet, Project, worst_case_amplification, interpolate_boundary_points, _points_in_polygon
+
+SQUARE = np.array([[10.0, -100.0], [200.0, -100.0], [200.0, 100.0], [10.0, 100.0]])
+# non-convex: the notch between the two arms is outside the polygon
+L_SHAPE = np.array([[0.0, 0.0], [100.0, 0.0], [100.0, 40.0], [40.0, 40.0], [40.0, 100.0], [0.0, 100.0]])
+
+def _project(vertices):
+    project = Project()
+    project.polygon_data_dict = {5: pd.DataFrame(vertices, columns=["R5", "X5"])}
+    return project
+
+def _brute_force(vertices, site_z):
+    """Largest AF over a dense grid inside the polygon and dense points along its boundary"""
+    min_xy, max_xy = vertices.min(axis=0), vertices.max(axis=0)
+    R, X = np.meshgrid(np.linspace(min_xy[0], max_xy[0], 401), np.linspace(min_xy[1], max_xy[1], 401))
+    inside = _points_in_polygon(vertices, R.ravel(), X.ravel())
+    points = np.vstack([np.column_stack([R.ravel(), X.ravel()])[inside],
+                        interpolate_boundary_points(vertices, num_pts=20000, include_vertices=True)])
+    af = calc_amplification_points(site_z.imag, site_z.real, points[:, 0], points[:, 1])
+    return af.max()
+
+@pytest.mark.parametrize("vertices, site_z", [
+    (SQUARE, 42.1 - 344.2j),
+    (SQUARE, -5.0 + 0.0j),
+    (SQUARE, -250.0 - 150.0j),
+    (L_SHAPE, -80.0 - 80.0j),
+    (L_SHAPE, -45.0 - 70.0j),
+    (L_SHAPE, 20.0 + 10.0j),
+])
+def test_matches_brute_force(vertices, site_z):
+    worst = worst_case_amplification(_project(vertices), h=5, site_z=site_z).loc[5]
+    brute = _brute_force(vertices, site_z)
+    # the exact maximum bounds every sampled point and the dense sample gets close to it
+    assert brute <= worst['AF']*(1 + 1e-9)
+    assert brute >= worst['AF']*(1 - 1e-3)
+    # and the reported point gives that AF
+    assert np.isclose(calc_amplification_points(site_z.imag, site_z.real, worst['R'], worst['X']), worst['AF'])
+
+@pytest.mark.parametrize("vertices, site_z", [(SQUARE, -100.0 - 20.0j), (L_SHAPE, -20.0 - 80.0j)])
+def test_resonance_inside_is_unbounded(vertices, site_z):
+    worst = worst_case_amplification(_project(vertices), h=5, site_z=site_z).loc[5]
+    assert np.isinf(worst['AF'])
+    assert (worst['R'], worst['X']) == (-site_z.real, -site_z.imag)
+
+def test_empty_orders_are_nan():
+    project = Project()
+    project.polygons = PolygonSet([5, 7], [0, 4, 4], SQUARE)
+    worst = worst_case_amplification(project, site_z=42.1 - 344.2j)
+    assert np.isfinite(worst.loc[5]).all()
+    assert worst.loc[7].isna().all()
+
+def test_site_impedance_is_keyword_only():
+    with pytest.raises(TypeError):
+        worst_case_amplification(_project(SQUARE), 5, 42.1 - 344.2j)